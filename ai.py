@@ -0,0 +1,164 @@
+import numpy as np
+
+from collision import LAYER_SOLID
+
+# distance from the camera focus up to which enemies are in each band
+NEAR_DISTANCE = 400
+MID_DISTANCE = 1000
+
+# frames between ticks of enemies in each band
+NEAR_INTERVAL = 1
+MID_INTERVAL = 4
+FAR_INTERVAL = 15
+
+# frames between re-banding every enemy
+REBAND_INTERVAL = 15
+
+SIGHT_RANGE = 350
+
+
+class Perception(object):
+    """
+        What an enemy knows about its target when it thinks,
+        filled in by AIScheduler for a whole batch of enemies.
+
+        @self.target        = GameObject being tracked, None if there is none
+
+        @self.distance      = float, distance to the target
+
+        @self.direction     = tuple, normalized direction to the target
+
+        @self.visible       = boolean, target in sight range with no solids
+                              in between
+
+        @self.steering      = tuple, (dx, dy) step towards the target from the
+                              scheduler's flow field, (0, 0) if there is none
+    """
+
+    def __init__(self, target=None, distance=0, direction=(0, 0), visible=False,
+                 steering=(0, 0)):
+        self.target = target
+        self.distance = distance
+        self.direction = direction
+        self.visible = visible
+        self.steering = steering
+
+
+class AIScheduler(object):
+    """
+        Runs enemy AI at a level of detail based on distance from the
+        camera focus. Near enemies think every frame, those further
+        away every MID_INTERVAL or FAR_INTERVAL frames, spread across
+        frames so each frame only ticks a slice of them. Enemies receive
+        the time accumulated since their last tick.
+
+        Enemies must have a think(dt, perception) method.
+
+        @self.world         = World whose enemies are scheduled
+
+        @self.flow          = navigation.FlowField shared by every enemy to steer
+                              towards the target, None to not path find
+
+        @self._bands        = list of (interval, slices), slices[i] is the list of
+                              enemies ticked on frames where frame % interval == i
+
+        @self._last_tick    = dict, enemy -> time of its last tick, see forget
+    """
+    intervals = (NEAR_INTERVAL, MID_INTERVAL, FAR_INTERVAL)
+
+    def __init__(self, world, sight_range=SIGHT_RANGE, flow=None):
+        self.world = world
+        self.sight_range = sight_range
+        self.flow = flow
+        self.frame = 0
+        self._bands = [(i, [[] for _ in range(i)]) for i in self.intervals]
+        self._last_tick = {}
+
+    def forget(self, enemy):
+        """
+            Drop what is kept about enemy, call when it's released to
+            an ObjectPool so it doesn't inherit its last tick once reused.
+        """
+        self._last_tick.pop(enemy, None)
+
+    def __reband__(self):
+        """Sort every enemy into a band in one vectorized pass"""
+        enemies = list(self.world.enemies)
+        last_tick = self._last_tick
+        for e in [e for e in last_tick if e not in self.world.enemies]:
+            del last_tick[e]
+        for interval, slices in self._bands:
+            for s in slices:
+                del s[:]
+        if not enemies:
+            return
+        focus = self.world.get_camera_rect().center
+        centers = np.array([e.rect.center for e in enemies], dtype=float)
+        dist = np.hypot(centers[:, 0] - focus[0], centers[:, 1] - focus[1])
+        band = np.digitize(dist, (NEAR_DISTANCE, MID_DISTANCE))
+        counts = [0, 0, 0]
+        for e, b in zip(enemies, band.tolist()):
+            interval, slices = self._bands[b]
+            slices[counts[b] % interval].append(e)
+            counts[b] += 1
+
+    def __perceive__(self, enemies, target):
+        """
+            Perception for a batch of enemies, distances are computed
+            at once and line of sight is only cast for enemies in range.
+        """
+        if target is None:
+            return [Perception() for _ in enemies]
+        tx, ty = target.rect.center
+        centers = np.array([e.rect.center for e in enemies], dtype=float)
+        dx = tx - centers[:, 0]
+        dy = ty - centers[:, 1]
+        dist = np.hypot(dx, dy)
+        safe = np.where(dist > 0, dist, 1)
+        ux = (dx / safe).tolist()
+        uy = (dy / safe).tolist()
+        in_range = (dist <= self.sight_range).tolist()
+        world = self.world
+        flow = self.flow
+        found = []
+        for i, e in enumerate(enemies):
+            visible = False
+            if in_range[i]:
+                visible = world.hitscan(e.rect.center, (tx, ty), LAYER_SOLID, ignore=e) is None
+            steering = flow.direction_at(*e.rect.center) if flow is not None else (0, 0)
+            found.append(Perception(target, float(dist[i]), (ux[i], uy[i]), visible, steering))
+        return found
+
+    def __target__(self):
+        """Closest player to the camera focus"""
+        players = self.world.players
+        if not players:
+            return None
+        fx, fy = self.world.get_camera_rect().center
+        return min(players, key=lambda p: (p.rect.centerx - fx) ** 2 + (p.rect.centery - fy) ** 2)
+
+    def update(self, t):
+        """
+            Tick the enemies due this frame, t is the same time value
+            World.update receives.
+        """
+        if self.frame % REBAND_INTERVAL == 0:
+            self.__reband__()
+        frame = self.frame
+        self.frame += 1
+        target = self.__target__()
+        if self.flow is not None and target is not None:
+            self.flow.update(target.rect.center)
+        due = []
+        for interval, slices in self._bands:
+            for e in slices[frame % interval]:
+                # removed or sleeping enemies don't think
+                if e.world is self.world and not e.sleeping:
+                    due.append(e)
+        if not due:
+            return
+        last_tick = self._last_tick
+        for e, perception in zip(due, self.__perceive__(due, target)):
+            last = last_tick.get(e, t)
+            last_tick[e] = t
+            e.think(t - last, perception)
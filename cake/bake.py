@@ -0,0 +1,217 @@
+
+"""
+    Bakes particle effects into flipbooks. An effect that looks the
+    same every time it's triggered, like an explosion or a puff of
+    smoke, is simulated once off screen with a fixed seed and its frames
+    are replayed through a Strip or SSprite instead of being simulated
+    live, with the frames cached on disk between runs.
+"""
+
+import os, random, hashlib, tempfile
+import numpy as np
+import pygame
+
+from .particle import ParticleSystem, ParticleGovernor
+from .strip import Strip
+
+BAKE_FRAMES = 30
+BAKE_FRAME_TIME = 1 / 50.
+BAKE_SIZE = (64, 64)
+BAKE_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'cake_bake')
+
+# simulated time the effect starts at
+BAKE_CLOCK = 1000.0
+
+# bump when baking changes so old cache files are not used
+BAKE_VERSION = 1
+
+
+def _describe(value):
+    """Stable description of an effect parameter for the cache key"""
+    if isinstance(value, pygame.Surface):
+        data = pygame.image.tostring(value, 'RGBA')
+        return 'Surface%s:%s' % (value.get_size(), hashlib.sha1(data).hexdigest())
+    if isinstance(value, dict):
+        return '{%s}' % ', '.join('%r: %s' % (k, _describe(value[k])) for k in sorted(value))
+    if isinstance(value, (list, tuple)):
+        return '(%s)' % ', '.join(_describe(v) for v in value)
+    if isinstance(value, type):
+        return '%s.%s' % (value.__module__, value.__name__)
+    return repr(value)
+
+
+class EffectBaker(object):
+    """
+        Runs particle spawners headlessly and renders them into frames.
+
+        An effect is a spawner class, the keyword props it is built with
+        and the particle properties set on it. The spawner is placed at
+        the center of frames of self.size, simulated for self.frames
+        frames of self.frame_time seconds each with random and
+        numpy.random seeded with self.seed, and every frame is drawn onto
+        a transparent surface. The global random state is restored after.
+
+        Baked effects are kept in memory and saved to cache_dir as one
+        PNG atlas, frames side by side, named by a hash of the effect,
+        the bake settings and BAKE_VERSION.
+
+        @self.size          = tuple, (width, height) of each frame
+
+        @self.frames        = int, number of frames to bake
+
+        @self.frame_time    = float, seconds of simulation per frame
+
+        @self.seed          = int
+
+        @self.cache_dir     = str, None to not cache on disk
+
+        @self._baked        = dict, cache key -> list of frames
+    """
+
+    def __init__(self, size=BAKE_SIZE, frames=BAKE_FRAMES, frame_time=BAKE_FRAME_TIME,
+                 seed=0, cache_dir=BAKE_CACHE_DIR):
+        assert frames > 0, \
+            'frames < 1'
+        self.size = tuple(size)
+        self.frames = frames
+        self.frame_time = frame_time
+        self.seed = seed
+        self.cache_dir = cache_dir
+        self._baked = {}
+
+    def key(self, spawner_class, props=None, p_data=None):
+        """Cache key of an effect baked with the current settings"""
+        desc = _describe((BAKE_VERSION, spawner_class, props or {}, p_data or {},
+                            self.size, self.frames, self.frame_time, self.seed))
+        return hashlib.sha1(desc.encode('utf-8')).hexdigest()
+
+    def __path__(self, key):
+        return os.path.join(self.cache_dir, key + '.png')
+
+    def __simulate__(self, spawner_class, props, p_data):
+        w, h = self.size
+        # a private governor so baking never counts against the game's budget
+        gov = ParticleGovernor()
+        system = ParticleSystem(governor=gov)
+        props = dict(props or {})
+        props['governor'] = gov
+        spawner = spawner_class((w // 2, h // 2), system, **props)
+        for prop, val in (p_data or {}).items():
+            spawner.set_particle_property(prop, val)
+        frames = []
+        # a fixed clock keeps the bake identical from run to run
+        t0 = spawner._birth = BAKE_CLOCK
+        for i in range(self.frames):
+            t = t0 + i * self.frame_time
+            if not spawner.is_dead():
+                spawner.update(t)
+            system.update(t)
+            frame = pygame.Surface(self.size, pygame.SRCALPHA)
+            system.draw(frame)
+            frames.append(frame)
+        return frames
+
+    def __load__(self, key):
+        if self.cache_dir is None:
+            return None
+        path = self.__path__(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            atlas = pygame.image.load(path)
+        except pygame.error:
+            return None
+        w, h = self.size
+        if atlas.get_size() != (w * self.frames, h):
+            return None
+        return [atlas.subsurface((i * w, 0, w, h)).copy() for i in range(self.frames)]
+
+    def __save__(self, key, frames):
+        if self.cache_dir is None:
+            return
+        w, h = self.size
+        atlas = pygame.Surface((w * len(frames), h), pygame.SRCALPHA)
+        for i, frame in enumerate(frames):
+            atlas.blit(frame, (i * w, 0))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # write then rename so a crash never leaves a partial atlas
+        path = self.__path__(key)
+        tmp = path + '.tmp.png'
+        pygame.image.save(atlas, tmp)
+        os.replace(tmp, path)
+
+    def bake(self, spawner_class, props=None, p_data=None):
+        """
+            Get the frames of an effect, from memory, the disk cache
+            or by simulating it.
+            e.g. baker.bake(Explosion, {'intensity': 40}, {'size': 6})
+        """
+        key = self.key(spawner_class, props, p_data)
+        frames = self._baked.get(key)
+        if frames is None:
+            frames = self.__load__(key)
+            if frames is None:
+                state = random.getstate(), np.random.get_state()
+                random.seed(self.seed)
+                np.random.seed(self.seed)
+                try:
+                    frames = self.__simulate__(spawner_class, props, p_data)
+                finally:
+                    random.setstate(state[0])
+                    np.random.set_state(state[1])
+                self.__save__(key, frames)
+            self._baked[key] = frames
+        return frames
+
+    def bake_strip(self, spawner_class, props=None, p_data=None, repeat=0):
+        """
+            Get an effect as a Strip played at the speed it was baked at,
+            an SSprite can play the same frames with
+            SSprite(frames, strip_timing=baker.frame_time).
+        """
+        frames = self.bake(spawner_class, props, p_data)
+        return Strip(frames, repeat=repeat, strip_timing=self.frame_time)
+
+    def clear(self):
+        """Forget effects baked in memory, the disk cache is kept"""
+        self._baked.clear()
+
+
+########################################################################
+## Unit Testing                                                       ##
+########################################################################
+if __name__ == '__main__':
+
+    import unittest, shutil
+    from .particle import Explosion
+
+    class UnitTestEffectBaker(unittest.TestCase):
+
+        def setUp(self):
+            self.dir = tempfile.mkdtemp()
+
+        def tearDown(self):
+            shutil.rmtree(self.dir)
+
+        def test_deterministic(self):
+            a = EffectBaker(frames=5, cache_dir=None).bake(Explosion)
+            b = EffectBaker(frames=5, cache_dir=None).bake(Explosion)
+            for fa, fb in zip(a, b):
+                self.assertEqual(pygame.image.tostring(fa, 'RGBA'),
+                                 pygame.image.tostring(fb, 'RGBA'))
+
+        def test_disk_cache(self):
+            baker = EffectBaker(frames=5, cache_dir=self.dir)
+            frames = baker.bake(Explosion, {'intensity': 10})
+            self.assertEqual(len(os.listdir(self.dir)), 1)
+            loaded = EffectBaker(frames=5, cache_dir=self.dir).bake(Explosion, {'intensity': 10})
+            self.assertEqual(pygame.image.tostring(frames[3], 'RGBA'),
+                             pygame.image.tostring(loaded[3], 'RGBA'))
+            baker.bake(Explosion, {'intensity': 11})
+            self.assertEqual(len(os.listdir(self.dir)), 2)
+
+        def test_strip(self):
+            strip = EffectBaker(frames=4, cache_dir=None).bake_strip(Explosion)
+            self.assertTrue(isinstance(strip.next(0), pygame.Surface))
+
+    unittest.main()
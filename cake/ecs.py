@@ -0,0 +1,400 @@
+
+"""
+    Entity component system. Entities are ids, their components are
+    stored by archetype (the set of component types an entity has) in
+    dense per-type columns, and systems run once per archetype over
+    whole columns instead of calling a method on every object.
+
+    This is optional and works alongside GameObject, see adopt().
+"""
+
+
+###################################################
+## COMPONENTS
+###################################################
+
+class Position(object):
+    __slots__ = ['x', 'y']
+
+    def __init__(self, x=0, y=0):
+        self.x = x
+        self.y = y
+
+
+class Velocity(object):
+    __slots__ = ['x', 'y']
+
+    def __init__(self, x=0, y=0):
+        self.x = x
+        self.y = y
+
+
+class Gravity(object):
+    """
+        Same gravity model as GameObject, airtime is the time the
+        entity went airborne at, 0 if it hasn't yet.
+    """
+    __slots__ = ['x', 'y', 'airborne', 'airtime']
+
+    def __init__(self, x=0, y=0, airborne=False):
+        self.x = x
+        self.y = y
+        self.airborne = airborne
+        self.airtime = 0
+
+
+class Sprite(object):
+    __slots__ = ['image', 'rect']
+
+    def __init__(self, image):
+        self.image = image
+        self.rect = image.get_rect()
+
+
+class Animation(object):
+    """Animation strip, cake.strip.Strip, that sets Sprite.image"""
+    __slots__ = ['strip']
+
+    def __init__(self, strip):
+        self.strip = strip
+
+
+class Brain(object):
+    """
+        AI state of an entity, behaviour is run by an AISystem
+        over every Brain at once, the component only holds data.
+    """
+    __slots__ = ['state', 'target', 'timer']
+
+    def __init__(self, state=None, target=None):
+        self.state = state
+        self.target = target
+        self.timer = 0
+
+
+class Link(object):
+    """Link back to the GameObject an entity was adopted from"""
+    __slots__ = ['obj']
+
+    def __init__(self, obj):
+        self.obj = obj
+
+
+###################################################
+## STORAGE
+###################################################
+
+class Archetype(object):
+    """
+        Storage of every entity with exactly the same set of
+        component types.
+
+        @self.key           = frozenset of component types
+
+        @self.entities      = list of entity ids, row i of every column
+                              belongs to self.entities[i]
+
+        @self.columns       = dict, component type -> list of components
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.entities = []
+        self.columns = dict((ctype, []) for ctype in key)
+
+    def column(self, ctype):
+        """Get column of ctype components, None if not in archetype"""
+        return self.columns.get(ctype)
+
+    def append(self, eid, components):
+        self.entities.append(eid)
+        for ctype, column in self.columns.items():
+            column.append(components[ctype])
+        return len(self.entities) - 1
+
+    def pop_row(self, row):
+        """
+            Remove row in constant time by moving the last row into it.
+            Returns (components of removed row, entity moved into row or None)
+        """
+        removed = {}
+        last = len(self.entities) - 1
+        moved = None
+        for ctype, column in self.columns.items():
+            removed[ctype] = column[row]
+            column[row] = column[last]
+            column.pop()
+        if row != last:
+            moved = self.entities[last]
+            self.entities[row] = moved
+        self.entities.pop()
+        return removed, moved
+
+    def __len__(self):
+        return len(self.entities)
+
+
+class Registry(object):
+    """
+        Holds every entity and its components.
+
+        @self._archetypes   = dict, frozenset of types -> Archetype
+
+        @self._locations    = dict, entity id -> (Archetype, row)
+
+        @self._queries      = dict, query key -> list of matching archetypes,
+                              dropped whenever a new archetype is created
+    """
+
+    def __init__(self):
+        self._archetypes = {}
+        self._locations = {}
+        self._queries = {}
+        self._next_id = 0
+
+    def __archetype__(self, key):
+        arch = self._archetypes.get(key)
+        if arch is None:
+            arch = self._archetypes[key] = Archetype(key)
+            self._queries.clear()
+        return arch
+
+    def __place__(self, eid, components):
+        arch = self.__archetype__(frozenset(components))
+        row = arch.append(eid, components)
+        self._locations[eid] = (arch, row)
+
+    def __take__(self, eid):
+        """Remove eid from its archetype, returning its components"""
+        arch, row = self._locations.pop(eid)
+        components, moved = arch.pop_row(row)
+        if moved is not None:
+            self._locations[moved] = (arch, row)
+        return components
+
+    def create(self, *components):
+        """Create an entity with components, returns entity id"""
+        eid = self._next_id
+        self._next_id += 1
+        self.__place__(eid, dict((type(c), c) for c in components))
+        return eid
+
+    def destroy(self, eid):
+        self.__take__(eid)
+
+    def add_component(self, eid, component):
+        """Add or replace a component, moving eid to its new archetype"""
+        components = self.__take__(eid)
+        components[type(component)] = component
+        self.__place__(eid, components)
+
+    def remove_component(self, eid, ctype):
+        components = self.__take__(eid)
+        components.pop(ctype, None)
+        self.__place__(eid, components)
+
+    def get(self, eid, ctype):
+        arch, row = self._locations[eid]
+        column = arch.column(ctype)
+        return column[row] if column is not None else None
+
+    def has(self, eid, ctype):
+        return ctype in self._locations[eid][0].key
+
+    def query(self, *ctypes):
+        """Get the non empty archetypes with all of ctypes"""
+        key = frozenset(ctypes)
+        archs = self._queries.get(key)
+        if archs is None:
+            archs = self._queries[key] = [
+                a for a in self._archetypes.values() if key <= a.key]
+        return [a for a in archs if a.entities]
+
+    def __contains__(self, eid):
+        return eid in self._locations
+
+    def __len__(self):
+        return len(self._locations)
+
+
+###################################################
+## SYSTEMS
+###################################################
+
+class System(object):
+    """Base class for systems, update runs over whole archetypes"""
+
+    def update(self, registry, t):
+        raise NotImplementedError
+
+
+class PhysicsSystem(System):
+    """
+        Applies gravity and velocity to every entity with Position and
+        Velocity, t is the same time value GameObject.update receives.
+    """
+
+    def update(self, registry, t):
+        for arch in registry.query(Position, Velocity):
+            gravity = arch.column(Gravity)
+            if gravity is not None:
+                for v, g in zip(arch.columns[Velocity], gravity):
+                    if g.airborne:
+                        if g.airtime == 0:
+                            g.airtime = t
+                        dt = t - g.airtime
+                        v.x += g.x * dt
+                        v.y += g.y * dt
+            for p, v in zip(arch.columns[Position], arch.columns[Velocity]):
+                p.x += v.x
+                p.y += v.y
+            sprites = arch.column(Sprite)
+            if sprites is not None:
+                for p, s in zip(arch.columns[Position], sprites):
+                    s.rect.topleft = round(p.x), round(p.y)
+
+
+class AnimationSystem(System):
+    """Advances the strip of every animated Sprite"""
+
+    def update(self, registry, t):
+        for arch in registry.query(Sprite, Animation):
+            for s, a in zip(arch.columns[Sprite], arch.columns[Animation]):
+                s.image = a.strip.next(t)
+
+
+class AISystem(System):
+    """
+        Runs one behaviour function per archetype with Brain components,
+        think(entities, brains, positions, t) gets whole columns so there
+        is no per-entity dispatch.
+    """
+
+    def __init__(self, think):
+        self.think = think
+
+    def update(self, registry, t):
+        for arch in registry.query(Brain, Position):
+            self.think(arch.entities, arch.columns[Brain], arch.columns[Position], t)
+
+
+class RenderSystem(System):
+    """
+        Draws every Sprite with a Position onto surf in one blits
+        call per archetype, offset by the camera position.
+    """
+
+    def __init__(self, surf, camera=(0, 0)):
+        self.surf = surf
+        self.camera = camera
+
+    def update(self, registry, t):
+        cx, cy = self.camera
+        blits = self.surf.blits
+        for arch in registry.query(Sprite, Position):
+            blits([(s.image, (round(p.x) - cx, round(p.y) - cy))
+                   for s, p in zip(arch.columns[Sprite], arch.columns[Position])],
+                  doreturn=False)
+
+
+class LinkSystem(System):
+    """Writes positions back to the GameObjects entities were adopted from"""
+
+    def update(self, registry, t):
+        for arch in registry.query(Link, Position):
+            for link, p in zip(arch.columns[Link], arch.columns[Position]):
+                obj = link.obj
+                obj.position.x = p.x
+                obj.position.y = p.y
+                obj.rect.topleft = round(p.x), round(p.y)
+
+
+def adopt(registry, obj, *components):
+    """
+        Create an entity from a GameObject's current state. The entity
+        gets Position, Velocity, Gravity, Sprite and Link components
+        plus any extra components given.
+
+        The entity owns the GameObject's simulation from then on, it is
+        taken out of its PhysicsStore and detached from its World (see
+        World.detach), which keeps colliding and drawing it where
+        LinkSystem puts it.
+        Returns entity id.
+    """
+    gravity = Gravity(obj.gravity.x, obj.gravity.y, obj.airborne)
+    gravity.airtime = obj.airtime
+    sprite = Sprite(obj.image)
+    # share the rect so the GameObject stays in sync for collision
+    sprite.rect = obj.rect
+    if obj.world is not None:
+        obj.world.detach(obj)
+    elif obj._body is not None:
+        obj._body.store.remove(obj)
+    return registry.create(Position(obj.position.x, obj.position.y),
+                           Velocity(obj.velocity.x, obj.velocity.y),
+                           gravity, sprite, Link(obj), *components)
+
+
+########################################################################
+## Unit Testing                                                       ##
+########################################################################
+if __name__ == '__main__':
+
+    import unittest
+
+    class UnitTestRegistry(unittest.TestCase):
+
+        def test_archetypes(self):
+            r = Registry()
+            a = r.create(Position(1, 2), Velocity(1, 0))
+            b = r.create(Position(5, 5))
+            self.assertEqual(len(r.query(Position)), 2)
+            self.assertEqual(len(r.query(Position, Velocity)), 1)
+            r.add_component(b, Velocity(0, 1))
+            self.assertEqual(len(r.query(Position, Velocity)), 1)
+            self.assertEqual(len(r.query(Position, Velocity)[0]), 2)
+            self.assertEqual(r.get(a, Position).x, 1)
+
+        def test_destroy_keeps_locations(self):
+            r = Registry()
+            ids = [r.create(Position(i, 0)) for i in range(4)]
+            r.destroy(ids[0])
+            for i in ids[1:]:
+                self.assertEqual(r.get(i, Position).x, i)
+            self.assertFalse(ids[0] in r)
+            self.assertEqual(len(r), 3)
+
+        def test_physics(self):
+            r = Registry()
+            e = r.create(Position(0, 0), Velocity(1, 0), Gravity(0, 1, airborne=True))
+            s = PhysicsSystem()
+            s.update(r, 1.0)
+            s.update(r, 2.0)
+            p = r.get(e, Position)
+            self.assertEqual((p.x, p.y), (2, 1))
+
+        def test_adopt_takes_object_out_of_physics(self):
+            import pygame
+            from .gameobject import GameObject
+            from .physics import PhysicsStore
+            obj = GameObject(pygame.Surface((4, 4)))
+            store = PhysicsStore()
+            store.add(obj)
+            obj.velocity.x = 3
+            r = Registry()
+            e = adopt(r, obj)
+            self.assertEqual(store.n, 0)
+            self.assertEqual(obj._body, None)
+            self.assertEqual(r.get(e, Velocity).x, 3)
+            PhysicsSystem().update(r, 1.0)
+            LinkSystem().update(r, 1.0)
+            self.assertEqual(obj.rect.x, 3)
+
+        def test_remove_component(self):
+            r = Registry()
+            e = r.create(Position(0, 0), Velocity(1, 0))
+            r.remove_component(e, Velocity)
+            self.assertFalse(r.has(e, Velocity))
+            self.assertEqual(len(r.query(Position, Velocity)), 0)
+
+    unittest.main()
@@ -2,6 +2,10 @@ from .vec2d import Vec2d
 from .ssprite import SSprite
 import pygame
 
+# collision layer masks, see GameObject.set_layers
+LAYER_NONE = 0
+LAYER_ALL = 0xFFFF
+
 
 class GameObject(pygame.sprite.Sprite):
     """
@@ -25,6 +29,27 @@ class GameObject(pygame.sprite.Sprite):
 
         @self.airtime      = float contains the duration of time the GameObject has been
                               airborne for. Used when calculating gravity
+
+        @self.precise      = boolean, use pixel perfect collision (cached masks) once
+                              the rect test reports an overlap
+
+        @self.category     = int, collision layer bit(s) the GameObject belongs to,
+                              LAYER_NONE until set or assigned by World
+
+        @self.collides_with = int, mask of categories the GameObject can collide with
+
+        @self.can_sleep    = boolean, allow World to put the object to sleep once it
+                              has been idle for long enough
+
+        @self.sleeping     = boolean, sleeping objects are skipped by World's update
+                              and collision until woken
+
+        @self.idle_frames  = int, number of consecutive frames the object has been idle
+
+        @self._body        = cake.physics.Body, set while the object's physics state lives
+                              in a World's PhysicsStore. position, velocity, gravity,
+                              airborne and airtime are then views into the store's arrays
+                              and the store integrates the object instead of update()
         
       
     """
@@ -33,6 +58,7 @@ class GameObject(pygame.sprite.Sprite):
         super(GameObject, self).__init__()
         # if image != None:
         self.image = image
+        self._body = None
         self.rect = image.get_rect()
         self.velocity = Vec2d(0, 0)
         self.position = Vec2d(0, 0)
@@ -40,6 +66,50 @@ class GameObject(pygame.sprite.Sprite):
         self.airtime = 0
         self.gravity = Vec2d(0, 0)
         self.world = None
+        self.precise = False
+        self.category = LAYER_NONE
+        self.collides_with = LAYER_ALL
+        self.can_sleep = True
+        self.sleeping = False
+        self.idle_frames = 0
+
+    def get_airborne(self):
+        body = self._body
+        if body is None:
+            return self._airborne
+        return bool(body.store.airborne[body.slot])
+
+    def set_airborne(self, b):
+        body = self._body
+        if body is None:
+            self._airborne = b
+        else:
+            body.store.airborne[body.slot] = b
+
+    def get_airtime(self):
+        body = self._body
+        if body is None:
+            return self._airtime
+        return float(body.store.airtime[body.slot])
+
+    def set_airtime(self, t):
+        body = self._body
+        if body is None:
+            self._airtime = t
+        else:
+            body.store.airtime[body.slot] = t
+
+    airborne = property(get_airborne, set_airborne)
+    airtime = property(get_airtime, set_airtime)
+
+    def is_batchable(self):
+        """
+            Check if the object can be integrated by a PhysicsStore,
+            i.e its class doesn't override __gravity__ or __move__
+        """
+        cls = type(self)
+        return cls.__gravity__ is GameObject.__gravity__ and \
+               cls.__move__ is GameObject.__move__
 
     def __gravity__(self, dt):
         """Apply gravity to object"""
@@ -69,6 +139,28 @@ class GameObject(pygame.sprite.Sprite):
         """
         pass
 
+    def on_enter(self, other):
+        """
+            Called by World when a contact with other starts,
+            calls collide() by default.
+        """
+        self.collide(other)
+
+    def on_stay(self, other):
+        """Called by World every frame a contact with other persists"""
+        pass
+
+    def on_exit(self, other):
+        """Called by World when a contact with other ends"""
+        pass
+
+    def on_shot(self, shot):
+        """
+            Called by World when a hitscan shot hits the object,
+            shot.hit holds the contact point and normal.
+        """
+        pass
+
     def __move__(self): 
         """Called by update method to change object's position using object's velocity"""
         v = self.velocity
@@ -77,6 +169,41 @@ class GameObject(pygame.sprite.Sprite):
         self.rect.x = round(p.x)
         self.rect.y = round(p.y)
 
+    def reset(self, x=0, y=0):
+        """
+            Reinitialize a recycled object, called by
+            ObjectPool.acquire. Child classes that keep more state
+            should extend this.
+        """
+        self.set_velocity(0, 0)
+        self.toggle_airborne(False)
+        self.sleeping = False
+        self.idle_frames = 0
+        self.set_position(x, y)
+
+    def wake(self):
+        """Wake the object up if it's sleeping"""
+        self.idle_frames = 0
+        if self.sleeping:
+            self.sleeping = False
+            if self.world is not None:
+                self.world.wake_object(self)
+
+    def is_idle(self):
+        """Check if object is at rest, i.e not airborne and not moving"""
+        return not self.airborne and self.velocity.x == 0 and self.velocity.y == 0
+
+    def set_layers(self, category, collides_with=None):
+        """
+            Set the collision category of the object and optionally
+            the mask of categories it collides with
+        """
+        self.category = category
+        if collides_with is not None:
+            self.collides_with = collides_with
+        if self.world is not None:
+            self.world.relayer_object(self)
+
     def set_gravity(self, x, y):
         """Set GameObject gravity"""
         self.gravity.x = x
@@ -87,34 +214,47 @@ class GameObject(pygame.sprite.Sprite):
         self.airborne = b if b != None else not self.airborne
         if not self.airborne:
             self.airtime = 0
+        else:
+            self.wake()
 
     def set_velocity(self, x, y):
         """Set object's velocity"""
         self.velocity.x = x
         self.velocity.y = y
+        if x or y:
+            self.wake()
 
     def set_velocityx(self, x):
         self.velocity.x = x
+        if x:
+            self.wake()
 
     def set_velocityy(self, y):
         self.velocity.y = y
+        if y:
+            self.wake()
 
     def set_position(self, x, y):
         """Set the position of the object"""
         self.position.x = x
         self.position.y = y
         self.rect.topleft = x, y
+        if self._body is not None:
+            self._body.store.sync_rect(self)
+        self.wake()
 
     def get_position(self):
         """Get the position of the object"""
         return list(self.position)
 
     def update(self, dt):
-        if self.airborne:
-            if self.airtime == 0:
-                self.airtime = dt
-            self.__gravity__(dt)
-        self.__move__() 
+        # bodies in a PhysicsStore are integrated by World in one step
+        if self._body is None:
+            if self.airborne:
+                if self.airtime == 0:
+                    self.airtime = dt
+                self.__gravity__(dt)
+            self.__move__() 
 
 class AnimGameObject(GameObject, SSprite):
     """
@@ -124,18 +264,26 @@ class AnimGameObject(GameObject, SSprite):
     """
     def __init__(self, default_frames, **kwargs):
         SSprite.__init__(self, default_frames, **kwargs)
+        self._body = None
         self.velocity = Vec2d(0, 0)
         self.position = Vec2d(0, 0)
         self.airtime = 0
         self.airborne = False
         self.gravity = Vec2d(0, 0)
         self.world = None
+        self.precise = False
+        self.category = LAYER_NONE
+        self.collides_with = LAYER_ALL
+        self.can_sleep = True
+        self.sleeping = False
+        self.idle_frames = 0
 
     def update(self, dt):
-        if self.airborne:
-            if self.airtime == 0:
-                self.airtime = dt
-            self.__gravity__(dt)
-        self.__move__()
+        if self._body is None:
+            if self.airborne:
+                if self.airtime == 0:
+                    self.airtime = dt
+                self.__gravity__(dt)
+            self.__move__()
         SSprite.update(self, dt)
 
@@ -0,0 +1,182 @@
+
+"""
+    Lazily built pixel masks for precise collision.
+
+    Building a pygame.mask.Mask walks every pixel of a surface, so masks
+    are built on first use and kept in a least recently used cache keyed
+    by the image they were built from.
+"""
+
+from collections import OrderedDict
+import pygame
+
+from .utils import rotate_center, flip_images
+
+MASK_CACHE_SIZE = 256
+
+
+class MaskCache(object):
+    """
+        LRU cache of pygame masks.
+
+        Masks are keyed by the surface object itself, rotated and flipped
+        variants are keyed by (surface, angle, flip_x, flip_y) so variants
+        produced through get_variant share one surface and mask per
+        transform. Pass the cache to cake.utils.rotate_center or
+        flip_images to get their variants from it, so sprites using them
+        keep hitting the same cached mask.
+
+        @self.max_size      = int, max number of cached entries before the
+                              least recently used one is evicted
+
+        @self._entries      = OrderedDict, key -> (surface, mask), ordered from
+                              least to most recently used
+    """
+
+    def __init__(self, max_size=MASK_CACHE_SIZE):
+        assert max_size > 0, \
+            'max_size < 1'
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def __lookup__(self, key):
+        entries = self._entries
+        entry = entries.get(key)
+        if entry is not None:
+            entries.move_to_end(key)
+        return entry
+
+    def __store__(self, key, entry):
+        entries = self._entries
+        entries[key] = entry
+        if len(entries) > self.max_size:
+            entries.popitem(last=False)
+        return entry
+
+    def get_mask(self, image):
+        """Get mask of image, building it if it isn't cached"""
+        entry = self.__lookup__(image)
+        if entry is None:
+            entry = self.__store__(image, (image, pygame.mask.from_surface(image)))
+        return entry[1]
+
+    def get_variant(self, image, angle=0, flip_x=False, flip_y=False):
+        """
+            Get (surface, mask) of an image flipped with
+            cake.utils.flip_images and then rotated with
+            cake.utils.rotate_center. The transformed surface is cached
+            along with its mask, so the same variant is only ever built
+            once while cached.
+        """
+        if not angle and not flip_x and not flip_y:
+            return image, self.get_mask(image)
+        key = (image, angle, flip_x, flip_y)
+        entry = self.__lookup__(key)
+        if entry is None:
+            surf = image
+            if flip_x or flip_y:
+                surf = flip_images([surf], flip_x, flip_y)[0]
+            if angle:
+                surf = rotate_center(surf, angle)
+            entry = self.__store__(key, (surf, pygame.mask.from_surface(surf)))
+            # the variant surface may be used directly as a sprite image
+            self.__store__(surf, entry)
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+
+# shared cache used by collide_precise
+masks = MaskCache()
+
+
+def collide_precise(a, b, cache=masks):
+    """
+        Pixel perfect collision test between two sprites.
+        Rects are tested first so masks are only built/used
+        for pairs the broad phase reports as overlapping.
+    """
+    ra, rb = a.rect, b.rect
+    if not ra.colliderect(rb):
+        return False
+    ma = cache.get_mask(a.image)
+    mb = cache.get_mask(b.image)
+    return ma.overlap(mb, (rb.x - ra.x, rb.y - ra.y)) is not None
+
+
+########################################################################
+## Unit Testing                                                       ##
+########################################################################
+if __name__ == '__main__':
+
+    import unittest
+
+    class Sprite(object):
+
+        def __init__(self, image, x=0, y=0):
+            self.image = image
+            self.rect = image.get_rect(topleft=(x, y))
+
+    def disc(size=10):
+        image = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.circle(image, (255, 0, 0), (size // 2, size // 2), size // 2)
+        return image
+
+    class UnitTestMaskCache(unittest.TestCase):
+
+        def test_lru_eviction(self):
+            cache = MaskCache(2)
+            a, b, c = disc(), disc(), disc()
+            cache.get_mask(a)
+            cache.get_mask(b)
+            # a becomes the most recently used, b is evicted next
+            cache.get_mask(a)
+            cache.get_mask(c)
+            self.assertEqual(len(cache), 2)
+            self.assertTrue(a in cache)
+            self.assertFalse(b in cache)
+            self.assertTrue(c in cache)
+
+        def test_mask_reused(self):
+            cache = MaskCache()
+            image = disc()
+            self.assertTrue(cache.get_mask(image) is cache.get_mask(image))
+
+        def test_variant_cached(self):
+            cache = MaskCache()
+            image = disc()
+            surf, mask = cache.get_variant(image, 90, True)
+            again = cache.get_variant(image, 90, True)
+            self.assertTrue(again[0] is surf)
+            self.assertTrue(again[1] is mask)
+            # the variant surface maps to the same mask
+            self.assertTrue(cache.get_mask(surf) is mask)
+
+        def test_variant_untransformed(self):
+            cache = MaskCache()
+            image = disc()
+            surf, mask = cache.get_variant(image)
+            self.assertTrue(surf is image)
+            self.assertTrue(mask is cache.get_mask(image))
+
+        def test_precise(self):
+            cache = MaskCache()
+            image = disc()
+            # rects overlap on the corners only, the discs don't touch
+            self.assertFalse(collide_precise(Sprite(image), Sprite(image, 9, 9), cache))
+            self.assertTrue(collide_precise(Sprite(image), Sprite(image, 5, 0), cache))
+
+        def test_rects_before_masks(self):
+            cache = MaskCache()
+            a, b = disc(), disc()
+            self.assertFalse(collide_precise(Sprite(a), Sprite(b, 50, 0), cache))
+            self.assertEqual(len(cache), 0)
+
+    unittest.main()
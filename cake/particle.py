@@ -5,9 +5,37 @@
 """
 
 import math, time, random
+import numpy as np
 import pygame
 from pygame import Color
 from .vec2d import Vec2d
+from .pool import ObjectPool
+
+PARTICLE_CAPACITY = 4096
+
+# alpha levels baked for fading particles
+FADE_LEVELS = 16
+
+# max live particles the governor allows
+PARTICLE_BUDGET = 4000
+TARGET_FRAME_TIME = 1 / 50.
+
+# quality below which only high priority particles reproduce
+REPRODUCE_QUALITY = 0.75
+
+# max descendants of the particles of one spawn, see ParticleSystem
+MAX_DESCENDANTS = 256
+MIN_QUALITY = 0.1
+
+PRIORITY_LOW = 0
+PRIORITY_NORMAL = 1
+PRIORITY_HIGH = 2
+
+BLEND_ALPHA = 0
+BLEND_ADD = 1
+
+# largest particle image PixelRenderer writes pixel by pixel
+PIXEL_MAX_SIZE = 8
 
 
 block = pygame.Surface((2,2))
@@ -26,6 +54,173 @@ def init():
 
 init()
 
+
+class ParticleImageCache(object):
+    """
+        Shared particle images keyed by (source image, size, color, rotation),
+        so spawning a particle does no transform work and every particle
+        with the same look shares one surface.
+
+        color fills a copy of the source, it is used to tint the solid
+        block particles are drawn with when they have no image, the
+        source itself is never modified. Surfaces are converted to the
+        display format when a display is set.
+
+        Fading particles use ramps, tuples of the same image baked at
+        evenly spaced alpha levels from transparent to opaque, so fading
+        is picking a ramp entry instead of changing a surface's alpha.
+
+        Entries are never evicted, particle effects only use a small
+        fixed set of looks, call clear() when changing levels.
+
+        @self._entries      = dict, (image, size, color, rotation) -> pygame.Surface
+
+        @self._ramps        = dict, (image, size, color, rotation, levels) -> tuple
+                              of pygame.Surface
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._ramps = {}
+
+    def get(self, image, size=None, color=None, rotation=0):
+        """
+            Get image rotated by rotation degrees, filled with color if not
+            None and scaled to (size, size) if size is not None.
+        """
+        if color is not None:
+            color = tuple(Color(color))
+        key = (image, size, color, rotation)
+        surf = self._entries.get(key)
+        if surf is None:
+            surf = image
+            if color is not None:
+                surf = surf.copy()
+                surf.fill(color)
+            if rotation:
+                surf = pygame.transform.rotate(surf, rotation)
+            if size is not None and surf.get_size() != (size, size):
+                surf = pygame.transform.scale(surf, (size, size))
+            if pygame.display.get_surface() is not None:
+                surf = surf.convert_alpha() if surf.get_flags() & pygame.SRCALPHA else surf.convert()
+            elif surf is image:
+                surf = surf.copy()
+            self._entries[key] = surf
+        return surf
+
+    def get_ramp(self, image, size=None, color=None, rotation=0, levels=FADE_LEVELS):
+        """
+            Get the fade ramp of an image, see get for the arguments.
+            ramp[i] has alpha 255 * i / (levels - 1), the last entry
+            is the opaque image returned by get.
+        """
+        if color is not None:
+            color = tuple(Color(color))
+        key = (image, size, color, rotation, levels)
+        ramp = self._ramps.get(key)
+        if ramp is None:
+            surf = self.get(image, size, color, rotation)
+            ramp = []
+            for i in range(levels - 1):
+                level = surf.copy()
+                level.set_alpha(round(255 * i / (levels - 1)))
+                ramp.append(level)
+            ramp.append(surf)
+            ramp = self._ramps[key] = tuple(ramp)
+        return ramp
+
+    def clear(self):
+        self._entries.clear()
+        self._ramps.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# shared cache used by particles and spawners
+particle_images = ParticleImageCache()
+
+
+class ParticleGovernor(object):
+    """
+        Keeps particle effects within a live particle budget and
+        the frame time target.
+
+        Every spawn asks allow() how many particles it may create,
+        lower priorities may only fill a share of the budget so
+        important effects always have room. When frames take longer
+        than the target, quality drops and effects degrade, spawning
+        fewer particles, with shorter lives and without reproduction,
+        quality recovers slowly once frames are fast again.
+
+        @self.budget        = int, max live particles
+
+        @self.target        = float, target frame time in seconds
+
+        @self.quality       = float, MIN_QUALITY - 1.0
+
+        @self.live          = int, live particles counted at the start of the frame
+                              plus those allowed since
+
+        @self.sources       = list of ParticleSystems and sprite groups whose
+                              particles count against the budget, see watch
+    """
+    # fraction of the budget each priority may fill
+    shares = (0.5, 0.8, 1.0)
+
+    def __init__(self, budget=PARTICLE_BUDGET, target_frame_time=TARGET_FRAME_TIME):
+        self.budget = budget
+        self.target = target_frame_time
+        self.quality = 1.0
+        self.live = 0
+        self.sources = []
+
+    def watch(self, source):
+        """Count the particles of a ParticleSystem or sprite group"""
+        if source not in self.sources:
+            self.sources.append(source)
+
+    def frame(self, frame_time):
+        """
+            Call once per frame with the time the last frame took
+            to process, recounts live particles and adjusts quality.
+        """
+        self.live = sum(len(s) for s in self.sources)
+        if frame_time > self.target:
+            self.quality = max(self.quality * 0.8, MIN_QUALITY)
+        else:
+            self.quality = min(self.quality + 0.02, 1.0)
+
+    def __scale__(self, priority):
+        if priority >= PRIORITY_HIGH:
+            return 1.0
+        if priority == PRIORITY_NORMAL:
+            return math.sqrt(self.quality)
+        return self.quality
+
+    def allow(self, n, priority=PRIORITY_NORMAL):
+        """
+            Get how many of n requested particles may be spawned now,
+            the budget only applies once sources are watched.
+        """
+        k = int(math.ceil(n * self.__scale__(priority)))
+        if self.sources:
+            room = int(self.budget * self.shares[min(priority, PRIORITY_HIGH)]) - self.live
+            k = max(min(k, room), 0)
+        self.live += k
+        return k
+
+    def life_scale(self, priority=PRIORITY_NORMAL):
+        """Factor particle life spans are multiplied by"""
+        return 0.5 + 0.5 * self.__scale__(priority)
+
+    def allow_reproduction(self, priority=PRIORITY_NORMAL):
+        return priority >= PRIORITY_HIGH or self.quality >= REPRODUCE_QUALITY
+
+
+# shared governor used by particles and spawners
+governor = ParticleGovernor()
+
 # ##################################################
 ## CORE CLASSES
 ###################################################
@@ -73,16 +268,40 @@ class Particle(pygame.sprite.Sprite):
         @self._child_particle   = typename, type name of child particle which will be spawned
                                   should the particle reproduce 
 
+        @self._allowance        = int, max descendants the particle may have should it
+                                  reproduce, max_descendants prop, split between children
+
         @self._age              = time, age of particle
 
         @self._orig_pos         = list, original position of particle 
 
         @self._props           = dict, contains properties of particle to be passed down to 
                                   child particles
+
+        @self._ramp             = tuple, shared fade ramp the image is picked from
+                                  if fade is set, see ParticleImageCache.get_ramp
+
+        Particles are recycled through the pools of get_particle_pool,
+        reset reinitializes a particle in place.
+
+        priority, one of the PRIORITY_* values, decides how reproduction
+        is limited by the governor.
+
+        If a cake.timer.TimerQueue is given as the timers prop, the
+        particle's death is scheduled on it instead of being checked
+        on every update.
     """
     def __init__(self, **props ):
 
         super(Particle, self).__init__()
+        self._velocity = Vec2d(0, 0)
+        self._gravity = Vec2d(0, 0)
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self._expiry = None
+        self.reset(**props)
+
+    def reset(self, **props):
+        """Reinitialize the particle with props, see class docstring"""
         fixed_life = props.get('fixed_life', None)
         if fixed_life is not None:
             self._life = fixed_life
@@ -90,8 +309,11 @@ class Particle(pygame.sprite.Sprite):
             self._life = props.get('max_life', 2) * random.random()
 
         self._birth = props.get('birth', time.time())
-        self._velocity = Vec2d(props.get('velocity', (0, -1)))
-        self._gravity = Vec2d(props.get('gravity', (0, 0)))
+        vx, vy = props.get('velocity', (0, -1))
+        self.set_velocity(vx, vy)
+        gx, gy = props.get('gravity', (0, 0))
+        self._gravity.x = gx
+        self._gravity.y = gy
         self._fade = props.get('fade', False)
         size = props.get('size', 5)
         self._reproduce = props.get('reproduce', False)
@@ -99,21 +321,36 @@ class Particle(pygame.sprite.Sprite):
         self._generation = props.get('generation', 0)
         self._max_children = props.get('max_children', 2)
         self._child_particle = props.get('child_particle', Particle)
+        self._priority = props.get('priority', PRIORITY_NORMAL)
+        self._allowance = props.get('max_descendants', MAX_DESCENDANTS)
         img = props.get('image', None)
-
+        color = None
         if img is None:
             img = block
             color = props.get('color', None)
-            if color is not None:
-                img.fill(color)
 
-        self.image = pygame.transform.scale(img, (size, size))
-        self.rect = self.image.get_rect()
+        self._ramp = None
+        if self._fade:
+            self._ramp = particle_images.get_ramp(img, size, color)
+            self.image = self._ramp[-1]
+        else:
+            self.image = particle_images.get(img, size, color)
+        self.rect.size = self.image.get_size()
         self._age = 0
         pos = props.get('pos', (0,0))
         self._orig_pos = list(pos)
         self.set_position(*pos)
         self._props = props
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+        timers = props.get('timers', None)
+        if timers is not None:
+            self._expiry = timers.schedule(self._birth + self._life, self.__expire__)
+
+    def __expire__(self, now):
+        self._expiry = None
+        self.kill()
 
     def __move__(self):
         """
@@ -131,16 +368,23 @@ class Particle(pygame.sprite.Sprite):
             death
         """
         groups = self.groups()
-        props = self._props
+        count = min(self._max_children, self._allowance)
+        count = governor.allow(count, self._priority)
+        if count <= 0:
+            return
+        # children get their own props, the parent's are shared with its siblings
+        props = dict(self._props)
         props['max_generations'] = self._max_generations
         props['generation'] = self._generation + 1
         props['max_children'] = self._max_children
+        props['max_descendants'] = (self._allowance - count) // count
         props['pos'] = (self.rect.x, self.rect.y)
         props['birth'] = time.time()
         props['max_life'] = self._life
         P = self._child_particle
-        for _ in range(self._max_children):
-            s = P(**props)
+        pool = get_particle_pool(P)
+        for _ in range(count):
+            s = pool.acquire(**props)
             for group in groups:
                 group.add(s)
 
@@ -168,10 +412,16 @@ class Particle(pygame.sprite.Sprite):
         return self._velocity
 
     def kill(self):
-        if self._reproduce is True:
+        if self._reproduce is True and governor.allow_reproduction(self._priority):
             if self._generation < self._max_generations:
                 self.__reproduce__()
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
         super(Particle, self).kill()
+        pool = getattr(self, '_pool', None)
+        if pool is not None:
+            pool.release(self)
 
     def update(self, t):
         """
@@ -183,7 +433,7 @@ class Particle(pygame.sprite.Sprite):
                 achieve desired results.
         """
         age = t - self._birth
-        if age >= self._life:
+        if self._expiry is None and age >= self._life:
             self.kill()
             return
         self.__gravity__()
@@ -191,14 +441,443 @@ class Particle(pygame.sprite.Sprite):
         life = age / self._life
         self._age = age
         if self._fade:
-            # max_alpha = 255 * ( self._max_generations - self._generation / float(self._max_generations))
-            max_alpha = 255
-            alpha = max_alpha - (max_alpha * life)
-            self.image.set_alpha(alpha)
+            ramp = self._ramp
+            self.image = ramp[int((1 - life) * (len(ramp) - 1))]
+
+
+class ParticleSystem(object):
+    """
+        Simulates many particles at once in NumPy arrays instead of
+        one Particle sprite each. Spawners given a ParticleSystem
+        instead of a sprite group emit into it, every particle is
+        integrated, aged and culled in one vectorized update.
+
+        Particles live in the slots of fixed capacity arrays, slots of
+        dead particles go on a free list and are handed out again by
+        emit, so a steady effect rate allocates nothing. Particles
+        emitted while every slot is in use are dropped.
+
+        Particles with max_children reproduce like Particle does when
+        they die, the children of every particle dying in an update are
+        emitted together in one batch. Each particle carries an
+        allowance of descendants it may still have, a parent's children
+        split what is left of its allowance, so the whole tree of an
+        emission never exceeds the allowance it started with.
+
+        @self.position      = float array (capacity, 2)
+
+        @self.velocity      = float array (capacity, 2), pixels per frame
+
+        @self.gravity       = float array (capacity, 2), see Particle.__gravity__
+
+        @self.birth         = float array, time particle was spawned
+
+        @self.life          = float array, life span in seconds
+
+        @self.alpha         = float array, 0 - 255, lowered over life if fade is set
+
+        @self.fade          = bool array
+
+        @self.generation    = int array, see Particle._generation
+
+        @self.max_generations = int array
+
+        @self.max_children  = int array, children spawned on death, 0 to not reproduce
+
+        @self.allowance     = int array, descendants the particle may still have
+
+        @self.priority      = int array, PRIORITY_* value, see ParticleGovernor
+
+        @self.image         = int array, index into self.images
+
+        @self.live          = bool array, slot holds a live particle
+
+        @self.images        = list of fade ramps, see ParticleImageCache.get_ramp,
+                              particles that don't fade have one entry ramps
+
+        @self.n             = int, number of live particles
+
+        @self.governor      = ParticleGovernor limiting reproduction
+
+        @self._free         = int array, stack of free slots, the first
+                              self._free_count entries are free
+    """
+
+    def __init__(self, capacity=PARTICLE_CAPACITY, governor=governor):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.n = 0
+        self.governor = governor
+        self.images = []
+        self._image_ids = {}
+        self._ramp_tops = np.zeros(0, dtype=np.int64)
+        self._max_size = 0
+        self.position = np.zeros((capacity, 2))
+        self.velocity = np.zeros((capacity, 2))
+        self.gravity = np.zeros((capacity, 2))
+        self.birth = np.zeros(capacity)
+        self.life = np.ones(capacity)
+        self.alpha = np.zeros(capacity)
+        self.fade = np.zeros(capacity, dtype=bool)
+        self.generation = np.zeros(capacity, dtype=np.int64)
+        self.max_generations = np.zeros(capacity, dtype=np.int64)
+        self.max_children = np.zeros(capacity, dtype=np.int64)
+        self.allowance = np.zeros(capacity, dtype=np.int64)
+        self.priority = np.zeros(capacity, dtype=np.int64)
+        self.image = np.zeros(capacity, dtype=np.int64)
+        self.live = np.zeros(capacity, dtype=bool)
+        # popped from the end, so low slots are used first
+        self._free = np.arange(capacity - 1, -1, -1)
+        self._free_count = capacity
+        # earliest death of a live particle, culling is skipped until then
+        self._next_expiry = float('inf')
+        # scratch buffers reused by every update
+        self._age = np.zeros(capacity)
+        self._mask = np.zeros(capacity, dtype=bool)
+        self._step = np.zeros((capacity, 2))
+
+    def image_index(self, image):
+        """
+            Get index of image in self.images, adding it if needed.
+            image is a fade ramp or a single pygame.Surface.
+        """
+        i = self._image_ids.get(image)
+        if i is None:
+            i = self._image_ids[image] = len(self.images)
+            self.images.append(image if isinstance(image, tuple) else (image,))
+            self._ramp_tops = np.array([len(r) - 1 for r in self.images])
+            self._max_size = max(self._max_size, *self.images[i][-1].get_size())
+        return i
+
+    def emit(self, n, pos, velocity, life, birth, gravity=(0, 0), image=0,
+             fade=False, generation=0, max_generations=0, max_children=0,
+             allowance=0, priority=PRIORITY_NORMAL):
+        """
+            Spawn up to n particles, every argument is either one value
+            for all of them or a NumPy array with one row per particle.
+            image is an index from image_index, see the class docstring
+            for reproduction.
+            Returns the slots of the new particles, only valid until the
+            next emit or update.
+        """
+        n = min(n, self._free_count)
+        top = self._free_count
+        slots = self._free[top - n:top]
+        if n <= 0:
+            return slots
+        self._free_count -= n
+        self.n += n
+        self.position[slots] = _per_particle(pos, n, 2)
+        self.velocity[slots] = _per_particle(velocity, n, 2)
+        self.gravity[slots] = _per_particle(gravity, n, 2)
+        self.birth[slots] = _per_particle(birth, n, 1)
+        self.life[slots] = _per_particle(life, n, 1)
+        self.alpha[slots] = 255
+        self.fade[slots] = _per_particle(fade, n, 1)
+        self.generation[slots] = _per_particle(generation, n, 1)
+        self.max_generations[slots] = _per_particle(max_generations, n, 1)
+        self.max_children[slots] = _per_particle(max_children, n, 1)
+        self.allowance[slots] = _per_particle(allowance, n, 1)
+        self.priority[slots] = _per_particle(priority, n, 1)
+        self.image[slots] = _per_particle(image, n, 1)
+        self.live[slots] = True
+        self._next_expiry = min(self._next_expiry, (self.birth[slots] + self.life[slots]).min())
+        return slots
+
+    def __free__(self, slots):
+        """Put slots back on the free list"""
+        k = len(slots)
+        self.live[slots] = False
+        # free slots stay still and keep a life to divide by
+        self.velocity[slots] = 0
+        self.gravity[slots] = 0
+        self.life[slots] = 1
+        self.max_children[slots] = 0
+        top = self._free_count
+        self._free[top:top + k] = slots
+        self._free_count += k
+        self.n -= k
+
+    def update(self, t):
+        """
+            Advance every particle one frame and cull the dead ones,
+            t is the same clock spawners are updated with.
+        """
+        if self.n == 0:
+            return
+        live = self.live
+        age = np.subtract(t, self.birth, out=self._age)
+        self.velocity += np.multiply(self.gravity, age[:, None], out=self._step)
+        self.position += self.velocity
+        if t >= self._next_expiry:
+            dead = np.greater_equal(age, self.life, out=self._mask)
+            dead &= live
+            dead = np.flatnonzero(dead)
+            children = self.__children__(dead, t)
+            self.__free__(dead)
+            expiry = np.add(self.birth, self.life, out=self._step[:, 0])
+            self._next_expiry = expiry[live].min() if self.n else float('inf')
+            if children is not None:
+                self.emit(*children)
+        fading = np.logical_and(self.fade, live, out=self._mask)
+        if fading.any():
+            frac = np.divide(age, self.life, out=self._age)
+            np.clip(frac, 0, 1, out=frac)
+            frac *= -255
+            frac += 255
+            np.copyto(self.alpha, frac, where=fading)
+
+    def visible_slots(self, viewport=None):
+        """
+            Get the slots of live particles, only those that may overlap
+            viewport, a pygame.Rect in particle coordinates, if given.
+        """
+        live = self.live
+        if viewport is None:
+            return np.flatnonzero(live)
+        pos = self.position
+        pad = self._max_size
+        x, y = pos[:, 0], pos[:, 1]
+        inside = live & (x > viewport.left - pad) & (x < viewport.right) & \
+            (y > viewport.top - pad) & (y < viewport.bottom)
+        return np.flatnonzero(inside)
+
+    def __children__(self, dead, t):
+        """
+            Arguments to emit the children of the dead particles with in one
+            batch, None if none of them reproduce. Children start where
+            their parent died, scatter at up to its speed and live up to
+            its life span.
+        """
+        parents = dead[(self.max_children[dead] > 0) &
+                       (self.generation[dead] < self.max_generations[dead]) &
+                       (self.allowance[dead] > 0)]
+        if len(parents) == 0:
+            return None
+        gov = self.governor
+        if gov is not None and not gov.allow_reproduction(PRIORITY_NORMAL):
+            parents = parents[self.priority[parents] >= PRIORITY_HIGH]
+            if len(parents) == 0:
+                return None
+        # each priority asks the governor for its own share of the budget
+        groups = []
+        shares = []
+        priority = self.priority[parents]
+        for prio in np.unique(priority).tolist():
+            group = parents[priority == prio]
+            counts = np.minimum(self.max_children[group], self.allowance[group])
+            n = int(counts.sum())
+            if gov is not None:
+                n = gov.allow(n, prio)
+            if n <= 0:
+                continue
+            # children left over after the parent's own are split between them
+            share = (self.allowance[group] - counts) // counts
+            groups.append(np.repeat(group, counts)[:n])
+            shares.append(np.repeat(share, counts)[:n])
+        if not groups:
+            return None
+        parent = np.concatenate(groups)
+        total = len(parent)
+        speed = np.hypot(self.velocity[parent, 0], self.velocity[parent, 1])
+        angle = np.random.uniform(0, 2 * math.pi, total)
+        velocity = np.empty((total, 2))
+        velocity[:, 0] = np.cos(angle) * speed
+        velocity[:, 1] = np.sin(angle) * speed
+        return (total, self.position[parent], velocity,
+                self.life[parent] * np.random.random(total), t,
+                self.gravity[parent], self.image[parent], self.fade[parent],
+                self.generation[parent] + 1, self.max_generations[parent],
+                self.max_children[parent], np.concatenate(shares),
+                self.priority[parent])
+
+    def draw(self, surf, offset=(0, 0), viewport=None):
+        """
+            Draw live particles in one blits call, offset is subtracted
+            from positions. Drawing is separate from update, so particles
+            can be simulated without being drawn and drawn more than once.
+            If viewport is given only particles overlapping it are drawn.
+        """
+        if self.n == 0 or not self.images:
+            return
+        self.blit_slots(surf, self.visible_slots(viewport), offset)
+
+    def blit_slots(self, surf, slots, offset=(0, 0)):
+        """Draw the particles in slots in one blits call"""
+        if len(slots) == 0:
+            return
+        images = self.images
+        ox, oy = offset
+        xy = (self.position[slots] - (ox, oy)).astype(np.int64).tolist()
+        kinds = self.image[slots]
+        # ramp entry for each particle's alpha
+        levels = (self.alpha[slots] * self._ramp_tops[kinds] / 255).astype(np.int64).tolist()
+        seq = [(images[i][l], p) for i, l, p in zip(kinds.tolist(), levels, xy)]
+        fblits = getattr(surf, 'fblits', None)
+        if fblits is not None:
+            fblits(seq)
+        else:
+            surf.blits(seq, doreturn=False)
+
+    def clear(self):
+        slots = np.flatnonzero(self.live)
+        if len(slots):
+            self.__free__(slots)
+        self._next_expiry = float('inf')
+
+    def __len__(self):
+        return self.n
+
+
+class PixelRenderer(object):
+    """
+        Draws the small particles of a ParticleSystem by writing their
+        pixels straight into the target surface through
+        pygame.surfarray, instead of one blit per particle. The pixels
+        of all particles are gathered with vectorized ops, accumulated
+        per screen pixel with np.add.at into a float buffer and stored
+        once, so dense sparks cost per pixel rather than per blit call.
+
+        Particles are blended by their alpha, BLEND_ADD adds the color
+        of every overlapping particle to the surface, BLEND_ALPHA mixes
+        the weighted average color of overlapping particles over the
+        surface by their combined coverage, so the result doesn't depend
+        on draw order. Particle images larger than max_size are blitted
+        as usual.
+
+        @self.blend         = int, BLEND_ALPHA or BLEND_ADD
+
+        @self.max_size      = int, largest image width or height drawn by pixels
+
+        @self._pixels       = dict, image -> (rgb float array (w, h, 3),
+                              alpha float array (w, h))
+    """
+
+    def __init__(self, blend=BLEND_ALPHA, max_size=PIXEL_MAX_SIZE):
+        self.blend = blend
+        self.max_size = max_size
+        self._pixels = {}
+
+    def __pixels__(self, image):
+        entry = self._pixels.get(image)
+        if entry is None:
+            rgb = pygame.surfarray.array3d(image).astype(float)
+            if image.get_flags() & pygame.SRCALPHA:
+                alpha = pygame.surfarray.array_alpha(image) / 255.
+            else:
+                alpha = np.ones(image.get_size())
+            entry = self._pixels[image] = (rgb, alpha)
+        return entry
+
+    def draw(self, surf, system, offset=(0, 0), viewport=None):
+        """Draw a ParticleSystem's live particles, see ParticleSystem.draw"""
+        if system.n == 0 or not system.images:
+            return
+        slots = system.visible_slots(viewport)
+        if len(slots) == 0:
+            return
+        kinds = system.image[slots]
+        large = []
+        target = pygame.surfarray.pixels3d(surf)
+        width, height = target.shape[:2]
+        xy = np.floor(system.position[slots] - offset).astype(np.int64)
+        opacity = system.alpha[slots] / 255.
+        # screen pixel (x * height + y), color and weight of every particle pixel
+        where, colors, weights = [], [], []
+        for kind in np.unique(kinds).tolist():
+            image = system.images[kind][-1]
+            if max(image.get_size()) > self.max_size:
+                large.append(slots[kinds == kind])
+                continue
+            rgb, alpha = self.__pixels__(image)
+            sel = kinds == kind
+            px, py, a = xy[sel, 0], xy[sel, 1], opacity[sel]
+            w, h = alpha.shape
+            for dx in range(w):
+                for dy in range(h):
+                    if alpha[dx, dy] == 0:
+                        continue
+                    x = px + dx
+                    y = py + dy
+                    weight = a * alpha[dx, dy]
+                    ok = (x >= 0) & (x < width) & (y >= 0) & (y < height) & (weight > 0)
+                    weight = weight[ok]
+                    where.append(x[ok] * height + y[ok])
+                    weights.append(weight)
+                    colors.append(rgb[dx, dy] * weight[:, None])
+        if where:
+            self.__blend__(target, np.concatenate(where), np.concatenate(colors),
+                           np.concatenate(weights))
+        # unlock the surface before blitting to it
+        del target
+        for group in large:
+            system.blit_slots(surf, group, offset)
+
+    def __blend__(self, target, where, colors, weights):
+        """Accumulate particle pixels per screen pixel and store them once"""
+        if len(where) == 0:
+            return
+        pixels, inverse = np.unique(where, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        x, y = np.divmod(pixels, target.shape[1])
+        color = np.zeros((len(pixels), 3))
+        np.add.at(color, inverse, colors)
+        dst = target[x, y].astype(float)
+        if self.blend == BLEND_ADD:
+            target[x, y] = np.minimum(dst + color, 255)
+            return
+        weight = np.zeros(len(pixels))
+        np.add.at(weight, inverse, weights)
+        # fraction of the background left after every particle covering it
+        keep = np.ones(len(pixels))
+        np.multiply.at(keep, inverse, 1 - weights)
+        keep = keep[:, None]
+        out = dst * keep + color / weight[:, None] * (1 - keep)
+        target[x, y] = np.clip(out, 0, 255)
+
+    def clear(self):
+        self._pixels.clear()
+
+
+def draw_particles(surf, group, offset=(0, 0), viewport=None):
+    """
+        Draw the Particle sprites of a group in one blits call, offset is
+        subtracted from their positions. If viewport is given only
+        particles whose rect overlaps it are drawn. Update the group
+        separately, Particle.update only simulates.
+    """
+    ox, oy = offset
+    if viewport is None:
+        seq = [(p.image, (p.rect.x - ox, p.rect.y - oy)) for p in group]
+    else:
+        collide = viewport.colliderect
+        seq = [(p.image, (p.rect.x - ox, p.rect.y - oy)) for p in group if collide(p.rect)]
+    surf.blits(seq, doreturn=False)
+
+
+# one pool per particle class, see get_particle_pool
+particle_pools = {}
 
-    def update(self, t, surf):
-        self.update(t)
-        surf.blit(self.image, self.rect)
+
+def get_particle_pool(particle_class):
+    """
+        Get the shared cake.pool.ObjectPool of a Particle class,
+        dead particles are released back to it by Particle.kill.
+    """
+    pool = particle_pools.get(particle_class)
+    if pool is None:
+        pool = particle_pools[particle_class] = ObjectPool(particle_class)
+    return pool
+
+
+def _per_particle(value, n, width):
+    """
+        First n rows of a per particle NumPy array argument of
+        ParticleSystem.emit, any other value applies to every row.
+    """
+    if isinstance(value, np.ndarray) and value.ndim == width:
+        return value[:n]
+    return value
 
 
 class ParticleSpawner(pygame.sprite.Sprite):
@@ -216,7 +895,16 @@ class ParticleSpawner(pygame.sprite.Sprite):
 
 
         default kwarg values:
-            p_data={}, intensity=5, life_span=5, spawn_time=0.5, colorize=False
+            p_data={}, intensity=5, life_span=5, spawn_time=0.5, colorize=False,
+            priority=PRIORITY_NORMAL, governor=governor
+
+        @self._priority         = int, PRIORITY_* value, how readily the governor
+                                  degrades the spawner's particles
+
+        @self._governor         = ParticleGovernor limiting spawned particles
+
+        @self._timer            = cake.timer.Timer of the next spawn if started on
+                                  a TimerQueue with start, None otherwise
         
         @self._intensity        = int, number of particles to be spawned at a time
         
@@ -239,7 +927,8 @@ class ParticleSpawner(pygame.sprite.Sprite):
         @self._age              = age of ParticleSpawner
 
         @self._pgroup           = pygame.sprite.Group, group that particles are added to
-                                  and updated from
+                                  and updated from, or a ParticleSystem that particles
+                                  are emitted into
 
         @self._pos              = list, position of ParticleSpawner,
                                   this affects where the particles are spawned
@@ -258,6 +947,8 @@ class ParticleSpawner(pygame.sprite.Sprite):
         self._life = props.get('life_span', 5)
         self._spawn_time = props.get('spawn_time', 0.5)
         self._colorize = props.get('colorize', False)
+        self._priority = props.get('priority', PRIORITY_NORMAL)
+        self._governor = props.get('governor', governor)
         self.p_data = {}
         pdata = props.get('p_data', {})
         self.p_data['size'] = pdata.get('size', 5)
@@ -267,6 +958,7 @@ class ParticleSpawner(pygame.sprite.Sprite):
         self.p_data['gravity'] = pdata.get('gravity', (0,0))
         self.p_data['fade'] = pdata.get('fade', True)
         self.p_data['image'] = pdata.get('image', None)
+        self.p_data['priority'] = self._priority
         self.particle = Particle
         self._birth = time.time()
         self._age = 0
@@ -274,6 +966,8 @@ class ParticleSpawner(pygame.sprite.Sprite):
         self._pgroup = particle_group
         self._pos = list(pos)
         self._color_list = []
+        self._timer = None
+        self._timers = None
 
     def __colorize__(self):
         """
@@ -297,9 +991,63 @@ class ParticleSpawner(pygame.sprite.Sprite):
         if self._colorize is True:
             self.__colorize__()
         self.p_data['birth'] = t
-        p = self.particle(**self.p_data)
+        p = get_particle_pool(self.particle).acquire(**self.p_data)
         self._pgroup.add(p)
 
+    def __sources__(self):
+        """Source images particles are picked from randomly"""
+        return [self.p_data.get('image', None)]
+
+    def __image_indexes__(self, n):
+        """
+            Image index into the ParticleSystem for each of n particles,
+            like Particle, color only applies to particles without an image
+            and colorizing discards the image.
+        """
+        system = self._pgroup
+        size = self.p_data.get('size', 5)
+        if self._colorize is True and self._color_list:
+            looks = [(block, color) for color in self._color_list]
+        else:
+            looks = [(img, None) if img is not None else (block, self.p_data.get('color', None))
+                     for img in self.__sources__()]
+        if self.p_data.get('fade', False):
+            get = particle_images.get_ramp
+        else:
+            get = particle_images.get
+        indexes = [system.image_index(get(img, size, color)) for img, color in looks]
+        if len(indexes) == 1:
+            return indexes[0]
+        return np.array(indexes)[np.random.randint(len(indexes), size=n)]
+
+    def __positions__(self, n):
+        return self._pos
+
+    def __velocities__(self, n):
+        return self.p_data.get('velocity', (0, -1))
+
+    def __emit__(self, t, n):
+        """
+            Used instead of __spawn__ when particles go to a ParticleSystem,
+            emits n particles in one batch
+        """
+        p_data = self.p_data
+        fixed_life = p_data.get('fixed_life', None)
+        if fixed_life is not None:
+            life = fixed_life
+        else:
+            life = p_data.get('max_life', 2) * np.random.random(n)
+        life = life * self._governor.life_scale(self._priority)
+        max_children = 0
+        allowance = 0
+        if p_data.get('reproduce', False) and n > 0:
+            max_children = p_data.get('max_children', 2)
+            allowance = p_data.get('max_descendants', MAX_DESCENDANTS) // n
+        self._pgroup.emit(n, self.__positions__(n), self.__velocities__(n), life, t,
+                          p_data.get('gravity', (0, 0)), self.__image_indexes__(n),
+                          p_data.get('fade', False), 0, p_data.get('max_generations', 2),
+                          max_children, allowance, self._priority)
+
     def set_position(self, x, y):
         """
             Set location where particles are to spawn
@@ -384,9 +1132,45 @@ class ParticleSpawner(pygame.sprite.Sprite):
             self.kill()
             return
         if t - self._spawn_clock > self._spawn_time:
-            for _ in range(self._intensity):
+            self.__spawn_batch__(t)
+
+    def __spawn_batch__(self, t):
+        """Spawn the particles of one tick"""
+        n = self._governor.allow(self._intensity, self._priority)
+        if isinstance(self._pgroup, ParticleSystem):
+            self.__emit__(t, n)
+        else:
+            for _ in range(n):
                 self.__spawn__(t)
-            self._spawn_clock = t
+        self._spawn_clock = t
+
+    def start(self, timers):
+        """
+            Drive the spawner from a cake.timer.TimerQueue instead of
+            calling update every frame, it then only runs when a spawn
+            is due. Particles spawned as sprites schedule their death
+            on the same queue.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timers = timers
+        self.p_data['timers'] = timers
+        self._timer = timers.schedule(timers.now, self.__tick__)
+
+    def __tick__(self, now):
+        self._timer = None
+        self._age = now - self._birth
+        if self.is_dead():
+            self.kill()
+            return
+        self.__spawn_batch__(now)
+        self._timer = self._timers.schedule(now + self._spawn_time, self.__tick__)
+
+    def kill(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        super(ParticleSpawner, self).kill()
 
     def is_dead(self):
         return self._age > self._life
@@ -420,13 +1204,22 @@ class Splatter(ParticleSpawner):
         image = props.get('image', None)
         if image:
             for angle in (0, 90, 180, 270):
-                self.images.append(pygame.transform.rotate(image, angle))
+                self.images.append(particle_images.get(image, rotation=angle))
 
 
     def set_max_scatter_speed(self, s):
         """Set maximum speed that particle may scatter in a direction"""
         self._max_scatter_speed = s
 
+    def __sources__(self):
+        if len(self.images) > 0:
+            return self.images
+        return super(Splatter, self).__sources__()
+
+    def __velocities__(self, n):
+        max_speed = self._max_scatter_speed
+        return np.random.uniform(-max_speed, max_speed, (n, 2))
+
     def __spawn__(self, t):
         p_data = self.p_data
         if len(self.images) > 0:
@@ -435,7 +1228,7 @@ class Splatter(ParticleSpawner):
             self.__colorize__()
         p_data['birth'] = t
         max_speed = self._max_scatter_speed
-        p = Particle(**p_data)
+        p = get_particle_pool(Particle).acquire(**p_data)
         v = Vec2d(random.uniform(-max_speed, max_speed), random.uniform(-max_speed, max_speed))
         p.set_velocity(v.x, v.y)
         self._pgroup.add(p)
@@ -462,12 +1255,18 @@ class RadialSplatter(Splatter):
             self.__colorize__()
         p_data['birth'] = t
         max_speed = 100
-        p = Particle(**p_data)
+        p = get_particle_pool(Particle).acquire(**p_data)
         direction = Vec2d(random.randint(-max_speed, max_speed), random.randint(-max_speed, max_speed)).normalized()
         v = direction * self._max_scatter_speed
         p.set_velocity(v.x, v.y)
         self._pgroup.add(p)
 
+    def __velocities__(self, n):
+        d = np.random.randint(-100, 101, (n, 2)).astype(float)
+        norm = np.hypot(d[:, 0], d[:, 1])
+        norm[norm == 0] = 1
+        return d / norm[:, None] * self._max_scatter_speed
+
 
 ###################################################
 ## CONVENIENCE CLASSES
@@ -482,13 +1281,13 @@ class SmokeParticle(Particle):
         location close to the specified location
     """
 
-    def __init__(self, *args, **props):
+    def reset(self, **props):
         if props.get('color', None) == None:
             props['color'] = (100, 100, 100)
         props['fade'] = props.get('fade', True)
         props['velocity'] = props.get('velocity', (0, -1.5))
         # props['reproduce'] = props.get('reproduce', True)
-        super(SmokeParticle, self).__init__(**props)
+        super(SmokeParticle, self).reset(**props)
         self.rect.x += random.randint(-5, 5)
         self.rect.y -= random.randint(-10, 10)
 
@@ -502,15 +1301,15 @@ class SmokeParticle(Particle):
 class CyclicParticle(Particle):
     """Particle that moves in a circular motion"""
 
-    def __init__(self, *args, **props):
-        super(CyclicParticle, self).__init__(*args, **props)
+    def reset(self, **props):
+        super(CyclicParticle, self).reset(**props)
         self.rect.x += random.randint(0, 5)
         self.rect.y -= random.randint(0, 5)
         self._clockwise = random.choice((1,-1))
-        self._velocity = Vec2d(2, 0)
+        self.set_velocity(2, 0)
 
     def set_motion_radius(self, r):
-        self._velocity = Vec2d(r, 0)
+        self.set_velocity(r, 0)
 
     def update(self, t):
         super(CyclicParticle, self).update(t)
@@ -546,3 +1345,140 @@ class Smoke(ParticleSpawner):
         props['life_span'] = props.get('life_span', 5)
         super(Smoke, self).__init__(pos, particle_group, **props)
         self.particle = SmokeParticle
+        if self.p_data.get('color', None) is None:
+            self.p_data['color'] = (100, 100, 100)
+        self.p_data['velocity'] = (0, -1.5)
+
+    def __positions__(self, n):
+        # same scatter around the spawn point SmokeParticle uses
+        offset = np.empty((n, 2))
+        offset[:, 0] = np.random.randint(-5, 6, n)
+        offset[:, 1] = np.random.randint(-10, 11, n)
+        return offset + self._pos
+
+    def __velocities__(self, n):
+        # a little horizontal drift in place of SmokeParticle's jitter
+        v = np.empty((n, 2))
+        v[:, 0] = np.random.uniform(-0.5, 0.5, n)
+        v[:, 1] = self.p_data['velocity'][1]
+        return v
+
+
+########################################################################
+## Unit Testing                                                       ##
+########################################################################
+if __name__ == '__main__':
+
+    import unittest
+
+    class UnitTestParticleSystem(unittest.TestCase):
+
+        def emit_reproducing(self, system, n, priority):
+            return system.emit(n, (0, 0), (1, 0), 1.0, 0.0, max_generations=2,
+                               max_children=2, allowance=10, priority=priority)
+
+        def test_no_reproduction_at_low_quality(self):
+            gov = ParticleGovernor()
+            system = ParticleSystem(64, governor=gov)
+            self.emit_reproducing(system, 10, PRIORITY_NORMAL)
+            gov.quality = 0.5
+            system.update(2.0)
+            self.assertEqual(len(system), 0)
+
+        def test_high_priority_reproduces_at_low_quality(self):
+            gov = ParticleGovernor()
+            system = ParticleSystem(64, governor=gov)
+            self.emit_reproducing(system, 2, PRIORITY_HIGH)
+            self.emit_reproducing(system, 2, PRIORITY_NORMAL)
+            gov.quality = 0.5
+            system.update(2.0)
+            self.assertEqual(len(system), 4)
+            self.assertTrue((system.priority[system.live] == PRIORITY_HIGH).all())
+
+        def test_children_use_own_priority_share(self):
+            gov = ParticleGovernor(budget=100)
+            system = ParticleSystem(256, governor=gov)
+            gov.watch(system)
+            self.emit_reproducing(system, 30, PRIORITY_LOW)
+            self.emit_reproducing(system, 1, PRIORITY_HIGH)
+            gov.frame(0)
+            system.update(2.0)
+            live = system.live
+            # low priority may only fill half the budget
+            self.assertEqual((system.priority[live] == PRIORITY_LOW).sum(), 50 - 31)
+            self.assertEqual((system.priority[live] == PRIORITY_HIGH).sum(), 2)
+
+        def test_allowance_caps_tree(self):
+            system = ParticleSystem(256, governor=None)
+            system.emit(1, (0, 0), (1, 0), 1.0, 0.0, max_generations=10,
+                        max_children=3, allowance=7)
+            emitted = 1
+            for i in range(2, 20):
+                # every particle lives less than a second, so all live
+                # particles after an update are new children
+                system.update(float(i))
+                emitted += system.n
+            self.assertTrue(emitted <= 1 + 7)
+
+        def test_tint_keeps_block(self):
+            before = pygame.image.tostring(block, 'RGB')
+            cache = ParticleImageCache()
+            red = cache.get(block, 4, (255, 0, 0))
+            Particle(color=(0, 255, 0), size=4, fixed_life=1, birth=0)
+            self.assertEqual(pygame.image.tostring(block, 'RGB'), before)
+            self.assertEqual(tuple(red.get_at((0, 0)))[:3], (255, 0, 0))
+            self.assertEqual(red.get_size(), (4, 4))
+            # same look, same surface
+            self.assertTrue(cache.get(block, 4, 'red') is red)
+            self.assertFalse(cache.get(block, 4, (0, 0, 255)) is red)
+
+        def test_ramp_levels(self):
+            cache = ParticleImageCache()
+            ramp = cache.get_ramp(block, 4, (255, 0, 0), levels=5)
+            self.assertEqual(len(ramp), 5)
+            for i, surf in enumerate(ramp[:-1]):
+                self.assertEqual(surf.get_alpha(), round(255 * i / 4.))
+            self.assertTrue(ramp[-1] is cache.get(block, 4, (255, 0, 0)))
+            self.assertTrue(cache.get_ramp(block, 4, (255, 0, 0), levels=5) is ramp)
+
+        def test_particle_fades_through_ramp(self):
+            p = Particle(fade=True, fixed_life=1.0, birth=0.0, size=4)
+            ramp = p._ramp
+            top = len(ramp) - 1
+            self.assertTrue(p.image is ramp[top])
+            for t in (0.0, 0.25, 0.5, 0.75, 0.99):
+                p.update(t)
+                self.assertTrue(p.image is ramp[int((1 - t) * top)])
+
+        def test_system_alpha_steps(self):
+            system = ParticleSystem(16, governor=None)
+            ramp = particle_images.get_ramp(block, 2, (255, 255, 255), levels=5)
+            kind = system.image_index(ramp)
+            slots = system.emit(1, (0, 0), (0, 0), 1.0, 0.0, image=kind, fade=True).copy()
+            for t, alpha, level in ((0.0, 255, 4), (0.5, 127.5, 2), (0.8, 51, 0)):
+                system.update(t)
+                self.assertAlmostEqual(system.alpha[slots[0]], alpha, places=4)
+                surf = pygame.Surface((4, 4), pygame.SRCALPHA)
+                system.draw(surf)
+                expected = pygame.Surface((4, 4), pygame.SRCALPHA)
+                expected.blit(ramp[level], (0, 0))
+                self.assertEqual(pygame.image.tostring(surf, 'RGBA'),
+                                 pygame.image.tostring(expected, 'RGBA'))
+
+        def draw_overlapping(self, blend):
+            system = ParticleSystem(16, governor=None)
+            dot = pygame.Surface((1, 1))
+            dot.fill((40, 20, 10))
+            image = system.image_index(dot)
+            system.emit(3, (2, 2), (0, 0), 10.0, 0.0, image=image)
+            surf = pygame.Surface((4, 4))
+            PixelRenderer(blend).draw(surf, system)
+            return surf.get_at((2, 2))[:3]
+
+        def test_pixels_add_up(self):
+            self.assertEqual(tuple(self.draw_overlapping(BLEND_ADD)), (120, 60, 30))
+
+        def test_pixels_alpha(self):
+            self.assertEqual(tuple(self.draw_overlapping(BLEND_ALPHA)), (40, 20, 10))
+
+    unittest.main()
@@ -0,0 +1,361 @@
+
+"""
+    Structure of arrays physics store. Positions, velocities, gravity
+    and airborne state of many GameObjects are kept in contiguous NumPy
+    arrays so they can all be integrated in one vectorized step, and
+    tested against a TileMap in the same step.
+"""
+
+import numpy as np
+from .vec2d import Vec2d
+
+PHYSICS_CAPACITY = 64
+
+
+class Body(object):
+    """
+        Handle of a GameObject's row in a PhysicsStore, the slot
+        changes when other bodies are removed from the store.
+    """
+    __slots__ = ['store', 'slot', 'obj']
+
+    def __init__(self, store, slot, obj):
+        self.store = store
+        self.slot = slot
+        self.obj = obj
+
+
+class VecView(Vec2d):
+    """
+        Vec2d whose x and y are read from and written to a row of one
+        of a PhysicsStore's arrays, so GameObject code using position,
+        velocity and gravity works unchanged.
+    """
+    __slots__ = ['_body', '_field']
+
+    def __init__(self, body, field):
+        self._body = body
+        self._field = field
+
+    def __row__(self):
+        body = self._body
+        return getattr(body.store, self._field)[body.slot]
+
+    def get_x(self):
+        return float(self.__row__()[0])
+
+    def set_x(self, value):
+        self.__row__()[0] = value
+
+    def get_y(self):
+        return float(self.__row__()[1])
+
+    def set_y(self, value):
+        self.__row__()[1] = value
+
+    x = property(get_x, set_x)
+    y = property(get_y, set_y)
+
+    def __reduce__(self):
+        # pickle as a plain Vec2d
+        return Vec2d, ((self.x, self.y),)
+
+
+class PhysicsStore(object):
+    """
+        Holds the physics state of many GameObjects in NumPy arrays,
+        row i of every array belongs to self.objects[i].
+
+        @self.position      = float array (capacity, 2)
+
+        @self.velocity      = float array (capacity, 2)
+
+        @self.gravity       = float array (capacity, 2)
+
+        @self.airborne      = bool array, see GameObject.airborne
+
+        @self.airtime       = float array, see GameObject.airtime
+
+        @self.awake         = bool array, only awake bodies are integrated
+
+        @self.rect_pos      = int array (capacity, 2), rect position of each body
+                              at the last sync, only changed rects are written
+
+        @self.size          = int array (capacity, 2), rect size of each body,
+                              used for the tile check
+
+        @self.objects       = list of GameObjects in the store
+
+        @self.n             = int, number of bodies in the store
+    """
+    fields = ('position', 'velocity', 'gravity')
+
+    def __init__(self, capacity=PHYSICS_CAPACITY):
+        self.n = 0
+        self.objects = []
+        self.__alloc__(max(capacity, 1))
+
+    def __alloc__(self, capacity):
+        n = self.n
+        old = getattr(self, 'position', None)
+        arrays = {
+            'position': np.zeros((capacity, 2)),
+            'velocity': np.zeros((capacity, 2)),
+            'gravity': np.zeros((capacity, 2)),
+            'airborne': np.zeros(capacity, dtype=bool),
+            'airtime': np.zeros(capacity),
+            'awake': np.zeros(capacity, dtype=bool),
+            'rect_pos': np.zeros((capacity, 2), dtype=np.int64),
+            'size': np.zeros((capacity, 2), dtype=np.int64),
+        }
+        for name, arr in arrays.items():
+            if old is not None:
+                arr[:n] = getattr(self, name)[:n]
+            setattr(self, name, arr)
+        self.capacity = capacity
+
+    def add(self, obj):
+        """
+            Move obj's physics state into the store, obj.position,
+            obj.velocity and obj.gravity become views into the arrays.
+            Returns the Body handle, also set as obj._body.
+        """
+        assert obj._body is None, \
+            'GameObject already has a body'
+        if self.n == self.capacity:
+            self.__alloc__(self.capacity * 2)
+        i = self.n
+        body = Body(self, i, obj)
+        for name in self.fields:
+            vec = getattr(obj, name)
+            getattr(self, name)[i] = vec.x, vec.y
+        self.airborne[i] = obj.airborne
+        self.airtime[i] = obj.airtime
+        self.awake[i] = not obj.sleeping
+        self.rect_pos[i] = obj.rect.topleft
+        self.size[i] = obj.rect.size
+        self.objects.append(obj)
+        self.n += 1
+        obj._body = body
+        for name in self.fields:
+            setattr(obj, name, VecView(body, name))
+        return body
+
+    def remove(self, obj):
+        """
+            Take obj out of the store in constant time by moving the
+            last row into its slot, obj gets plain Vec2d's back.
+        """
+        body = obj._body
+        assert body is not None and body.store is self, \
+            'GameObject is not in this store'
+        i = body.slot
+        state = [Vec2d(getattr(self, name)[i]) for name in self.fields]
+        airborne, airtime = bool(self.airborne[i]), float(self.airtime[i])
+        last = self.n - 1
+        if i != last:
+            for name in ('position', 'velocity', 'gravity', 'airborne',
+                         'airtime', 'awake', 'rect_pos', 'size'):
+                arr = getattr(self, name)
+                arr[i] = arr[last]
+            moved = self.objects[last]
+            self.objects[i] = moved
+            moved._body.slot = i
+        self.objects.pop()
+        self.n = last
+        obj._body = None
+        for name, vec in zip(self.fields, state):
+            setattr(obj, name, vec)
+        obj.airborne = airborne
+        obj.airtime = airtime
+
+    def sync_rect(self, obj):
+        """Record obj's rect position and size after it was set directly"""
+        slot = obj._body.slot
+        self.rect_pos[slot] = obj.rect.topleft
+        self.size[slot] = obj.rect.size
+
+    def set_awake(self, obj, awake):
+        self.awake[obj._body.slot] = awake
+
+    def __move_tiles__(self, rows, tilemap):
+        """
+            Move bodies one axis at a time, x first, stopping them
+            against the solid tiles of tilemap. A body blocked on an
+            axis is placed against the tile it hit and loses its
+            velocity on that axis, bodies landing on a tile are no
+            longer airborne.
+        """
+        ts = tilemap.tile_size
+        solid = np.frombuffer(tilemap.get_cells(), dtype=np.uint8)
+        solid = solid.reshape(tilemap.rows, tilemap.cols) != 0
+        pos = self.position
+        vel = self.velocity
+        size = self.size[rows]
+        for axis in (0, 1):
+            v = vel[rows, axis]
+            pos[rows, axis] += v
+            moving = np.flatnonzero(v != 0)
+            if len(moving) == 0:
+                continue
+            moved = rows[moving]
+            # test the rect the body will have, see step
+            rect_pos = np.round(pos[moved]).astype(np.int64)
+            hit, first, last = _tile_hits(solid, ts, rect_pos, size[moving], axis)
+            if not hit.any():
+                continue
+            blocked = moved[hit]
+            forward = v[moving][hit] > 0
+            pos[blocked, axis] = np.where(forward, first[hit] * ts - size[moving][hit, axis],
+                                          (last[hit] + 1) * ts)
+            vel[blocked, axis] = 0
+            if axis == 1:
+                landed = blocked[forward]
+                self.airborne[landed] = False
+                self.airtime[landed] = 0
+
+    def step(self, t, tilemap=None):
+        """
+            Integrate every awake body and sync the rects of those
+            whose rounded position changed. If tilemap is given bodies
+            are stopped by its solid tiles, see __move_tiles__.
+
+            t is the same time value GameObject.update receives,
+            gravity is applied the same way GameObject.__gravity__ does.
+        """
+        n = self.n
+        if n == 0:
+            return
+        active = np.flatnonzero(self.awake[:n])
+        if len(active) == 0:
+            return
+        air = active[self.airborne[active]]
+        if len(air):
+            airtime = self.airtime
+            first = air[airtime[air] == 0]
+            airtime[first] = t
+            self.velocity[air] += self.gravity[air] * (t - airtime[air])[:, None]
+        pos = self.position
+        if tilemap is None:
+            pos[active] += self.velocity[active]
+        else:
+            self.__move_tiles__(active, tilemap)
+
+        # np.round rounds half to even, same as round() in __move__
+        rounded = np.round(pos[active]).astype(np.int64)
+        changed = np.flatnonzero((rounded != self.rect_pos[active]).any(axis=1))
+        if len(changed) == 0:
+            return
+        rows = active[changed]
+        self.rect_pos[rows] = rounded[changed]
+        objects = self.objects
+        for i, (x, y) in zip(rows.tolist(), rounded[changed].tolist()):
+            objects[i].rect.topleft = x, y
+
+
+def _tile_hits(solid, tile_size, rect_pos, size, axis):
+    """
+        Test rects against a 2d bool array of solid tiles (rows, cols)
+        in one go. Every rect's span of tiles is laid out on a grid as
+        large as the largest span, cells outside a rect's own span or
+        the map are ignored.
+        Returns a bool array of rects touching a solid tile, and the
+        lowest and highest tile index along axis among those tiles.
+    """
+    lo = rect_pos // tile_size
+    hi = (rect_pos + np.maximum(size, 1) - 1) // tile_size
+    kx, ky = (hi - lo).max(axis=0) + 1
+    cols = lo[:, 0, None, None] + np.arange(kx)[None, None, :]
+    rows = lo[:, 1, None, None] + np.arange(ky)[None, :, None]
+    cols, rows = np.broadcast_arrays(cols, rows)
+    inside = (cols <= hi[:, 0, None, None]) & (rows <= hi[:, 1, None, None]) & \
+             (cols >= 0) & (cols < solid.shape[1]) & (rows >= 0) & (rows < solid.shape[0])
+    touching = np.zeros(cols.shape, dtype=bool)
+    touching[inside] = solid[rows[inside], cols[inside]]
+    index = cols if axis == 0 else rows
+    big = np.iinfo(np.int64).max
+    first = np.where(touching, index, big).min(axis=(1, 2))
+    last = np.where(touching, index, -1).max(axis=(1, 2))
+    return touching.any(axis=(1, 2)), first, last
+
+
+########################################################################
+## Unit Testing                                                       ##
+########################################################################
+if __name__ == '__main__':
+
+    import unittest
+    import pygame
+    from .gameobject import GameObject
+    from .tilemap import TileMap
+
+    def box(x, y):
+        obj = GameObject(pygame.Surface((10, 10)))
+        obj.set_position(x, y)
+        return obj
+
+    class UnitTestPhysicsStore(unittest.TestCase):
+
+        def setUp(self):
+            # solid floor on row 4 and a wall on column 6
+            self.tiles = TileMap.from_strings(['      #',
+                                               '      #',
+                                               '      #',
+                                               '      #',
+                                               '#######'], 10)
+
+        def test_lands_on_tiles(self):
+            store = PhysicsStore()
+            obj = box(12, 20)
+            store.add(obj)
+            obj.velocity.y = 15
+            obj.airborne = True
+            store.step(1.0, self.tiles)
+            self.assertEqual(obj.rect.topleft, (12, 30))
+            self.assertEqual(obj.velocity.y, 0)
+            self.assertFalse(store.airborne[0])
+
+        def test_stopped_by_wall(self):
+            store = PhysicsStore()
+            obj = box(30, 10)
+            store.add(obj)
+            obj.velocity.x = 25
+            store.step(1.0, self.tiles)
+            self.assertEqual(obj.rect.x, 50)
+            self.assertEqual(obj.velocity.x, 0)
+
+        def test_remove_swaps_last(self):
+            store = PhysicsStore()
+            objs = [box(i * 10, 0) for i in range(3)]
+            for obj in objs:
+                store.add(obj)
+            objs[2].velocity.x = 7
+            store.remove(objs[0])
+            self.assertEqual(store.n, 2)
+            # the last body moved into the freed slot with its state
+            self.assertTrue(store.objects[0] is objs[2])
+            self.assertEqual(objs[2]._body.slot, 0)
+            self.assertEqual(tuple(store.position[0]), (20, 0))
+            self.assertEqual(objs[2].velocity.x, 7)
+            # the removed object keeps its state as plain vectors
+            self.assertEqual(objs[0]._body, None)
+            self.assertEqual((objs[0].position.x, objs[0].position.y), (0, 0))
+
+        def test_remove_last(self):
+            store = PhysicsStore()
+            a, b = box(0, 0), box(10, 0)
+            store.add(a)
+            store.add(b)
+            store.remove(b)
+            self.assertEqual(store.objects, [a])
+            self.assertEqual(a._body.slot, 0)
+
+        def test_no_tilemap(self):
+            store = PhysicsStore()
+            obj = box(30, 10)
+            store.add(obj)
+            obj.velocity.x = 25
+            store.step(1.0)
+            self.assertEqual(obj.rect.x, 55)
+
+    unittest.main()
@@ -0,0 +1,114 @@
+
+"""
+    Object pooling, objects are built ahead of time and reused
+    instead of allocating new Surfaces, Sprites and Vec2d's
+    whenever something spawns.
+"""
+
+
+class ObjectPool(object):
+    """
+        Pool of reusable objects of one type.
+
+        Objects handed out by acquire() are reinitialized with their
+        reset() method, World.remove() releases pooled objects back
+        automatically.
+
+        @self.factory       = callable, builds a new object when the pool is empty
+
+        @self.on_release    = callable, called with every object released back
+                              to the pool, e.g to drop state kept about it
+                              elsewhere, None for nothing
+
+        @self._free         = list of objects ready to be acquired
+
+        @self.created       = int, total number of objects built by the pool
+    """
+
+    def __init__(self, factory, size=0, on_release=None):
+        self.factory = factory
+        self.on_release = on_release
+        self._free = []
+        self.created = 0
+        self.prewarm(size)
+
+    def __new_object__(self):
+        obj = self.factory()
+        obj._pool = self
+        obj._pooled = True
+        self.created += 1
+        return obj
+
+    def prewarm(self, n):
+        """Build objects until at least n are free, call during level load"""
+        free = self._free
+        while len(free) < n:
+            free.append(self.__new_object__())
+
+    def acquire(self, *args, **kwargs):
+        """
+            Get a free object, building one only if none are free,
+            args and kwargs are passed on to the object's reset method.
+        """
+        obj = self._free.pop() if self._free else self.__new_object__()
+        obj._pooled = False
+        obj.reset(*args, **kwargs)
+        return obj
+
+    def release(self, obj):
+        """Return obj to the pool, releasing an object twice is a no-op"""
+        assert getattr(obj, '_pool', None) is self, \
+            'Object does not belong to this pool'
+        if not obj._pooled:
+            obj._pooled = True
+            self._free.append(obj)
+            if self.on_release is not None:
+                self.on_release(obj)
+
+    def free_count(self):
+        return len(self._free)
+
+    def __len__(self):
+        return len(self._free)
+
+
+########################################################################
+## Unit Testing                                                       ##
+########################################################################
+if __name__ == '__main__':
+
+    import unittest
+
+    class Thing(object):
+
+        def reset(self, value=0):
+            self.value = value
+
+    class UnitTestObjectPool(unittest.TestCase):
+
+        def test_reuse(self):
+            pool = ObjectPool(Thing, 1)
+            a = pool.acquire(1)
+            pool.release(a)
+            b = pool.acquire(2)
+            self.assertTrue(a is b)
+            self.assertEqual(b.value, 2)
+            self.assertEqual(pool.created, 1)
+
+        def test_double_release(self):
+            released = []
+            pool = ObjectPool(Thing, on_release=released.append)
+            a = pool.acquire()
+            pool.release(a)
+            pool.release(a)
+            self.assertEqual(len(pool), 1)
+            self.assertEqual(released, [a])
+            # the object is handed out once, not twice
+            self.assertTrue(pool.acquire() is a)
+            self.assertFalse(pool.acquire() is a)
+
+        def test_foreign_object(self):
+            a = ObjectPool(Thing).acquire()
+            self.assertRaises(AssertionError, ObjectPool(Thing).release, a)
+
+    unittest.main()
@@ -0,0 +1,191 @@
+
+"""
+    Uniform grid spatial index, objects are bucketed by the
+    cells their rect covers so area queries only visit the
+    buckets under the queried rect.
+"""
+
+CELL_SIZE = 64
+
+
+class SpatialHash(object):
+    """
+        Spatial hash of objects keyed by cell index.
+
+        @self.cell_size     = int, width and height of a cell in pixels
+
+        @self._cells        = dict, (col, row) -> set of objects in that cell
+
+        @self._spans        = dict, object -> (c0, r0, c1, r1) inclusive range
+                              of cells the object was inserted into
+    """
+
+    def __init__(self, cell_size=CELL_SIZE):
+        assert cell_size > 0, \
+            'cell_size < 1'
+        self.cell_size = cell_size
+        self._cells = {}
+        self._spans = {}
+
+    def __span__(self, rect):
+        cs = self.cell_size
+        return (int(rect[0] // cs), int(rect[1] // cs),
+                int((rect[0] + max(rect[2], 1) - 1) // cs),
+                int((rect[1] + max(rect[3], 1) - 1) // cs))
+
+    def __bucket__(self, obj, span):
+        cells = self._cells
+        c0, r0, c1, r1 = span
+        for row in range(r0, r1 + 1):
+            for col in range(c0, c1 + 1):
+                bucket = cells.get((col, row))
+                if bucket is None:
+                    cells[(col, row)] = bucket = set()
+                bucket.add(obj)
+        self._spans[obj] = span
+
+    def __unbucket__(self, obj, span):
+        cells = self._cells
+        c0, r0, c1, r1 = span
+        for row in range(r0, r1 + 1):
+            for col in range(c0, c1 + 1):
+                bucket = cells.get((col, row))
+                if bucket is not None:
+                    bucket.discard(obj)
+                    if not bucket:
+                        del cells[(col, row)]
+
+    def insert(self, obj, rect):
+        """Insert obj covering rect, reinserts obj if already present"""
+        if obj in self._spans:
+            self.update(obj, rect)
+        else:
+            self.__bucket__(obj, self.__span__(rect))
+
+    def remove(self, obj):
+        span = self._spans.pop(obj, None)
+        if span is not None:
+            self.__unbucket__(obj, span)
+
+    def update(self, obj, rect):
+        """
+            Move obj to the cells covered by rect, nothing is
+            done unless the covered cells changed.
+        """
+        span = self.__span__(rect)
+        old = self._spans.get(obj)
+        if old == span:
+            return
+        if old is not None:
+            self.__unbucket__(obj, old)
+        self.__bucket__(obj, span)
+
+    def query(self, rect):
+        """Get set of objects in the cells covered by rect"""
+        cells = self._cells
+        found = set()
+        c0, r0, c1, r1 = self.__span__(rect)
+        for row in range(r0, r1 + 1):
+            for col in range(c0, c1 + 1):
+                bucket = cells.get((col, row))
+                if bucket:
+                    found |= bucket
+        return found
+
+    def cell_bucket(self, col, row):
+        """Get the objects in a single cell, None if it's empty"""
+        return self._cells.get((col, row))
+
+    def clear(self):
+        self._cells.clear()
+        self._spans.clear()
+
+    def __len__(self):
+        return len(self._spans)
+
+    def __contains__(self, obj):
+        return obj in self._spans
+
+    def __iter__(self):
+        return iter(self._spans)
+
+
+def grid_traverse(x0, y0, x1, y1, cell_size):
+    """
+        Walk the cells of a uniform grid crossed by the segment
+        (x0, y0) -> (x1, y1) in order, using a DDA traversal.
+        Yields (col, row, t_exit) where t_exit is the fraction of
+        the segment at which it leaves the cell, capped to 1.
+    """
+    dx = x1 - x0
+    dy = y1 - y0
+    col = int(x0 // cell_size)
+    row = int(y0 // cell_size)
+    end_col = int(x1 // cell_size)
+    end_row = int(y1 // cell_size)
+    inf = float('inf')
+
+    if dx > 0:
+        step_x, t_max_x, t_delta_x = 1, ((col + 1) * cell_size - x0) / dx, cell_size / dx
+    elif dx < 0:
+        step_x, t_max_x, t_delta_x = -1, (col * cell_size - x0) / dx, -cell_size / dx
+    else:
+        step_x, t_max_x, t_delta_x = 0, inf, inf
+    if dy > 0:
+        step_y, t_max_y, t_delta_y = 1, ((row + 1) * cell_size - y0) / dy, cell_size / dy
+    elif dy < 0:
+        step_y, t_max_y, t_delta_y = -1, (row * cell_size - y0) / dy, -cell_size / dy
+    else:
+        step_y, t_max_y, t_delta_y = 0, inf, inf
+
+    # one cell per boundary crossed, guards against float drift
+    steps = abs(end_col - col) + abs(end_row - row)
+    for _ in range(steps + 1):
+        t_exit = min(t_max_x, t_max_y)
+        yield col, row, min(t_exit, 1.0)
+        if t_exit >= 1.0:
+            return
+        if t_max_x < t_max_y:
+            col += step_x
+            t_max_x += t_delta_x
+        else:
+            row += step_y
+            t_max_y += t_delta_y
+
+
+########################################################################
+## Unit Testing                                                       ##
+########################################################################
+if __name__ == '__main__':
+
+    import unittest
+
+    class UnitTestGridTraverse(unittest.TestCase):
+
+        def cells(self, *args):
+            return [(col, row) for col, row, t in grid_traverse(*args)]
+
+        def test_single_cell(self):
+            self.assertEqual(self.cells(5, 5, 20, 30, 64), [(0, 0)])
+
+        def test_horizontal(self):
+            self.assertEqual(self.cells(10, 10, 200, 10, 64),
+                             [(0, 0), (1, 0), (2, 0), (3, 0)])
+
+        def test_backwards(self):
+            self.assertEqual(self.cells(200, 10, 10, 10, 64),
+                             [(3, 0), (2, 0), (1, 0), (0, 0)])
+
+        def test_diagonal_visits_every_crossed_cell(self):
+            cells = self.cells(10, 20, 140, 70, 64)
+            self.assertEqual(cells[0], (0, 0))
+            self.assertEqual(cells[-1], (2, 1))
+            for (c0, r0), (c1, r1) in zip(cells, cells[1:]):
+                self.assertEqual(abs(c1 - c0) + abs(r1 - r0), 1)
+
+        def test_t_exit(self):
+            t = [t for col, row, t in grid_traverse(0, 0, 128, 0, 64)]
+            self.assertAlmostEqual(t[0], 0.5)
+            self.assertEqual(t[-1], 1.0)
+
+    unittest.main()
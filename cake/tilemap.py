@@ -0,0 +1,199 @@
+
+"""
+    Tile based collision layer. Level geometry is stored as a
+    compact grid of solid flags instead of one GameObject per solid,
+    so a tile costs a single byte and a lookup is a constant time
+    index into the grid.
+"""
+
+import pygame
+from .spatial import grid_traverse
+
+TILE_EMPTY = 0
+TILE_SOLID = 1
+
+
+class TileMap(object):
+    """
+        Grid of solid flags covering a level, stored row major in a
+        bytearray.
+
+        @self.tile_size     = int, width and height of a tile in pixels
+
+        @self.cols          = int, number of columns in the grid
+
+        @self.rows          = int, number of rows in the grid
+
+        @self._cells        = bytearray, cols * rows tile flags
+    """
+
+    def __init__(self, cols, rows, tile_size):
+        assert cols > 0 and rows > 0, \
+            'TileMap must have at least one tile'
+        assert tile_size > 0, \
+            'tile_size < 1'
+        self.tile_size = tile_size
+        self.cols = cols
+        self.rows = rows
+        self._cells = bytearray(cols * rows)
+
+    @classmethod
+    def from_strings(cls, lines, tile_size, solid='#'):
+        """
+            Build a TileMap from a list of strings, one per row,
+            where every character in solid marks a solid tile.
+        """
+        cols = max(len(line) for line in lines)
+        tmap = cls(cols, len(lines), tile_size)
+        for row, line in enumerate(lines):
+            for col, c in enumerate(line):
+                if c in solid:
+                    tmap.set_solid(col, row)
+        return tmap
+
+    def get_size(self):
+        """Size of the map in pixels"""
+        return self.cols * self.tile_size, self.rows * self.tile_size
+
+    def cell_at(self, x, y):
+        """Get (col, row) of the cell containing pixel x, y"""
+        ts = self.tile_size
+        return int(x // ts), int(y // ts)
+
+    def in_bounds(self, col, row):
+        return 0 <= col < self.cols and 0 <= row < self.rows
+
+    def set_solid(self, col, row, solid=True):
+        """Mark a single tile as solid or empty"""
+        assert self.in_bounds(col, row), \
+            'Invalid tile (%s, %s)' % (col, row)
+        self._cells[row * self.cols + col] = TILE_SOLID if solid else TILE_EMPTY
+
+    def fill_rect(self, rect, solid=True):
+        """Mark every tile touched by a pixel rect as solid or empty"""
+        c0, r0, c1, r1 = self.__cell_span__(pygame.Rect(rect))
+        flag = TILE_SOLID if solid else TILE_EMPTY
+        cols = self.cols
+        for row in range(r0, r1 + 1):
+            start = row * cols
+            self._cells[start + c0:start + c1 + 1] = bytes([flag]) * (c1 - c0 + 1)
+
+    def is_solid(self, col, row):
+        """Check tile by cell index, tiles outside the map are empty"""
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            return self._cells[row * self.cols + col] == TILE_SOLID
+        return False
+
+    def is_solid_at(self, x, y):
+        """Check tile containing pixel x, y"""
+        ts = self.tile_size
+        return self.is_solid(int(x // ts), int(y // ts))
+
+    def __cell_span__(self, rect):
+        """
+            Get the inclusive cell range covered by rect, clamped
+            to the map. Returns c0, r0, c1, r1, the range is empty
+            when c0 > c1 or r0 > r1.
+        """
+        ts = self.tile_size
+        c0 = max(rect.left // ts, 0)
+        r0 = max(rect.top // ts, 0)
+        c1 = min((rect.right - 1) // ts, self.cols - 1)
+        r1 = min((rect.bottom - 1) // ts, self.rows - 1)
+        return c0, r0, c1, r1
+
+    def collide_rect(self, rect):
+        """
+            Check if a pixel rect overlaps any solid tile, only
+            the cells under rect are visited.
+        """
+        c0, r0, c1, r1 = self.__cell_span__(rect)
+        if c0 > c1:
+            return False
+        cells = self._cells
+        cols = self.cols
+        for row in range(r0, r1 + 1):
+            start = row * cols
+            if TILE_SOLID in cells[start + c0:start + c1 + 1]:
+                return True
+        return False
+
+    def raycast(self, start, end):
+        """
+            Walk the tiles crossed by the segment start -> end with a
+            DDA traversal and stop at the first solid tile.
+            Returns (t, normal) where t is the fraction of the segment
+            at which it enters the tile and normal the face it entered
+            through, or None if the segment hits nothing.
+        """
+        prev = None
+        t_enter = 0.0
+        for col, row, t_exit in grid_traverse(start[0], start[1], end[0], end[1], self.tile_size):
+            if self.is_solid(col, row):
+                if prev is None:
+                    # started inside a solid tile
+                    return 0.0, (0, 0)
+                if col != prev[0]:
+                    return t_enter, (prev[0] - col, 0)
+                return t_enter, (0, prev[1] - row)
+            prev = col, row
+            t_enter = t_exit
+        return None
+
+    def get_cells(self):
+        """
+            Get the underlying bytearray of tile flags, row major,
+            for readers that index many tiles at once.
+        """
+        return self._cells
+
+    def solid_rects(self):
+        """Yield a pygame.Rect for every solid tile"""
+        ts = self.tile_size
+        cols = self.cols
+        for i, flag in enumerate(self._cells):
+            if flag == TILE_SOLID:
+                yield pygame.Rect((i % cols) * ts, (i // cols) * ts, ts, ts)
+
+    def render(self, surf, color, offset=(0, 0)):
+        """Draw every solid tile onto surf, used to bake the level background"""
+        ox, oy = offset
+        for rect in self.solid_rects():
+            surf.fill(color, rect.move(ox, oy))
+
+
+########################################################################
+## Unit Testing                                                       ##
+########################################################################
+if __name__ == '__main__':
+
+    import unittest
+
+    class UnitTestTileMap(unittest.TestCase):
+
+        def setUp(self):
+            self.tiles = TileMap.from_strings(['     ',
+                                               '  #  ',
+                                               '     '], 10)
+
+        def test_normal_left(self):
+            t, normal = self.tiles.raycast((5, 15), (45, 15))
+            self.assertAlmostEqual(t, 15 / 40.)
+            self.assertEqual(normal, (-1, 0))
+
+        def test_normal_right(self):
+            self.assertEqual(self.tiles.raycast((45, 15), (5, 15))[1], (1, 0))
+
+        def test_normal_top(self):
+            self.assertEqual(self.tiles.raycast((25, 5), (25, 29))[1], (0, -1))
+
+        def test_normal_bottom(self):
+            self.assertEqual(self.tiles.raycast((25, 29), (25, 5))[1], (0, 1))
+
+        def test_miss(self):
+            self.assertEqual(self.tiles.raycast((5, 5), (45, 5)), None)
+
+        def test_start_inside(self):
+            self.assertEqual(self.tiles.raycast((25, 15), (45, 15)), (0.0, (0, 0)))
+
+    unittest.main()
@@ -0,0 +1,145 @@
+
+"""
+    Central timer queue. Things that need to happen at a point in time,
+    like a spawner's next spawn or a particle's death, are scheduled on
+    one min-heap that is advanced with a single clock read per frame,
+    so only the timers that are due get touched.
+"""
+
+import heapq
+
+
+class Timer(object):
+    """
+        Handle of a scheduled callback, returned by TimerQueue.schedule.
+
+        @self.when          = float, time the callback is due at
+
+        @self.callback      = callable, called with the current time,
+                              None once cancelled or fired
+    """
+    __slots__ = ['when', 'callback']
+
+    def __init__(self, when, callback):
+        self.when = when
+        self.callback = callback
+
+    def cancel(self):
+        self.callback = None
+
+    def is_active(self):
+        return self.callback is not None
+
+
+class TimerQueue(object):
+    """
+        Min-heap of timers ordered by due time.
+
+        Cancelled timers stay in the heap and are skipped when they
+        come up, so cancelling is constant time.
+
+        Timers scheduled by callbacks while the queue is advancing are
+        held back until the advance is done, so they fire on the next
+        advance at the earliest, even if they are already due.
+
+        @self.now           = float, time given to the last advance
+
+        @self._heap         = list of (when, seq, Timer), seq keeps timers
+                              due at the same time in scheduling order
+
+        @self._held         = list of heap entries scheduled during advance,
+                              None when not advancing
+    """
+
+    def __init__(self, now=0):
+        self.now = now
+        self._heap = []
+        self._seq = 0
+        self._held = None
+
+    def schedule(self, when, callback):
+        """Call callback(now) once the queue is advanced to when, returns Timer"""
+        timer = Timer(when, callback)
+        self._seq += 1
+        entry = (when, self._seq, timer)
+        if self._held is not None:
+            self._held.append(entry)
+        else:
+            heapq.heappush(self._heap, entry)
+        return timer
+
+    def advance(self, now):
+        """
+            Fire every timer due at or before now, call once per frame.
+            Timers scheduled by the callbacks fire on a later advance.
+        """
+        self.now = now
+        heap = self._heap
+        self._held = held = []
+        try:
+            while heap and heap[0][0] <= now:
+                timer = heapq.heappop(heap)[2]
+                callback = timer.callback
+                if callback is not None:
+                    timer.callback = None
+                    callback(now)
+        finally:
+            self._held = None
+            for entry in held:
+                heapq.heappush(heap, entry)
+
+    def clear(self):
+        for entry in self._heap:
+            entry[2].callback = None
+        del self._heap[:]
+
+    def __len__(self):
+        return len(self._heap)
+
+
+########################################################################
+## Unit Testing                                                       ##
+########################################################################
+if __name__ == '__main__':
+
+    import unittest
+
+    class UnitTestTimerQueue(unittest.TestCase):
+
+        def test_order(self):
+            q = TimerQueue()
+            fired = []
+            for when, name in ((3, 'c'), (1, 'a'), (2, 'b'), (1, 'a2')):
+                q.schedule(when, lambda now, name=name: fired.append(name))
+            q.advance(0.5)
+            self.assertEqual(fired, [])
+            q.advance(2)
+            self.assertEqual(fired, ['a', 'a2', 'b'])
+            q.advance(5)
+            self.assertEqual(fired, ['a', 'a2', 'b', 'c'])
+
+        def test_cancel(self):
+            q = TimerQueue()
+            fired = []
+            t = q.schedule(1, fired.append)
+            q.schedule(1, fired.append)
+            t.cancel()
+            self.assertFalse(t.is_active())
+            q.advance(1)
+            self.assertEqual(fired, [1])
+
+        def test_reschedule_from_callback(self):
+            q = TimerQueue()
+            fired = []
+
+            def tick(now):
+                fired.append(now)
+                # due immediately, must wait for the next advance
+                q.schedule(now, tick)
+
+            q.schedule(0, tick)
+            q.advance(1)
+            q.advance(2)
+            self.assertEqual(fired, [1, 2])
+
+    unittest.main()
@@ -30,8 +30,11 @@ def slice_msurf(surf, width, height=0, startx=0, starty=0):
         slices.append(slice_hsurf(row, width, height))
     return slices
 
-def rotate_center(img, angle):
-    """Rotate square image while keeping its center"""
+def rotate_center(img, angle, masks=None):
+    """Rotate square image while keeping its center, if masks is
+       a cake.maskcache.MaskCache the cached variant is returned"""
+    if masks is not None:
+        return masks.get_variant(img, angle)[0]
     orig_rect = img.get_rect()
     rot_image = pygame.transform.rotate(img, angle)
     rot_rect = orig_rect.copy()
@@ -45,7 +48,10 @@ def rotate_center2(image, rect, angle):
     rot_rect = rot_image.get_rect(center=rect.center)
     return rot_image,rot_rect
 
-def flip_images(images, x, y):
-    """flip list of images"""
+def flip_images(images, x, y, masks=None):
+    """flip list of images, if masks is a cake.maskcache.MaskCache
+       the cached variants are returned"""
+    if masks is not None:
+        return [masks.get_variant(img, 0, x, y)[0] for img in images]
     flipped = [pygame.transform.flip(img, x, y) for img in images]
     return flipped
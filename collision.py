@@ -2,6 +2,49 @@
 __doc__ = """
     Just some collision functions
 """
+from cake.maskcache import collide_precise, masks
+from cake.gameobject import LAYER_NONE, LAYER_ALL
+
+# collision categories, a GameObject's category is one of these
+# and its collides_with mask is any combination of them
+LAYER_SOLID = 1
+LAYER_PLAYER = 2
+LAYER_ENEMY = 4
+LAYER_ITEM = 8
+LAYER_PROJECTILE = 16
+LAYER_TRIGGER = 32
+
+# default collides_with masks World assigns per kind of object
+SOLID_COLLIDES_WITH = LAYER_PLAYER | LAYER_ENEMY | LAYER_PROJECTILE
+PLAYER_COLLIDES_WITH = LAYER_SOLID | LAYER_ENEMY | LAYER_ITEM | LAYER_TRIGGER | LAYER_PROJECTILE
+ENEMY_COLLIDES_WITH = LAYER_SOLID | LAYER_PLAYER | LAYER_ITEM | LAYER_PROJECTILE
+ITEM_COLLIDES_WITH = LAYER_PLAYER | LAYER_ENEMY
+
+
+def layers_match(obj, spr):
+    """
+        Check if two objects' layers allow them to collide, both
+        objects must have the other's category in their collides_with
+        mask. This is only a couple of integer ops so it should be used
+        to reject pairs before any geometry test.
+    """
+    return (obj.category & spr.collides_with) != 0 and \
+           (spr.category & obj.collides_with) != 0
+
+
+
+def collide_broad_precise(obj, spr):
+    """
+        Rect test, followed by a pixel perfect test when either
+        object has its precise flag set. Masks are never touched
+        for pairs whose rects don't overlap.
+    """
+    if not obj.rect.colliderect(spr.rect):
+        return False
+    if obj.precise or spr.precise:
+        return collide_precise(obj, spr)
+    return True
+
 def collide_right(obj, spr):
     # otop, oleft, obot, oright = *obj.rect.topleft, *obj.rect.bottomright
     # stop, sleft, sbot, sright = *spr.rect.topleft, *spr.rect.bottomright
@@ -34,3 +77,74 @@ def collide_top(obj, spr):
             # return True
     return False
 
+
+
+def ray_rect(x0, y0, dx, dy, rect):
+    """
+        Slab test of the segment (x0, y0) -> (x0 + dx, y0 + dy)
+        against rect. Returns the fraction of the segment at which
+        it enters rect, 0 if it starts inside, or None on a miss.
+    """
+    t0, t1 = 0.0, 1.0
+    for p, d, lo, hi in ((x0, dx, rect.left, rect.right),
+                         (y0, dy, rect.top, rect.bottom)):
+        if d == 0:
+            if p < lo or p >= hi:
+                return None
+            continue
+        a = (lo - p) / d
+        b = (hi - p) / d
+        if a > b:
+            a, b = b, a
+        if a > t0:
+            t0 = a
+        if b < t1:
+            t1 = b
+        if t0 > t1:
+            return None
+    return t0
+
+
+def ray_object(x0, y0, dx, dy, obj, cache=masks):
+    """
+        Like ray_rect against obj.rect, but when obj has its precise
+        flag set the segment is walked pixel by pixel through the rect
+        and only a set pixel of obj's mask counts as a hit. The mask
+        is only touched once the rect test hits.
+    """
+    t = ray_rect(x0, y0, dx, dy, obj.rect)
+    if t is None or not obj.precise:
+        return t
+    mask = cache.get_mask(obj.image)
+    w, h = mask.get_size()
+    rect = obj.rect
+    length = max(abs(dx), abs(dy))
+    # one step per pixel along the major axis
+    step = 1.0 / length if length else 1.0
+    while t <= 1.0:
+        mx = int(x0 + dx * t) - rect.x
+        my = int(y0 + dy * t) - rect.y
+        if not (0 <= mx < rect.width and 0 <= my < rect.height):
+            break
+        if mx < w and my < h and mask.get_at((mx, my)):
+            return t
+        t += step
+    return None
+
+
+def circle_rect(cx, cy, radius, rect):
+    """Check if the circle at (cx, cy) overlaps rect"""
+    nx = min(max(cx, rect.left), rect.right)
+    ny = min(max(cy, rect.top), rect.bottom)
+    return (cx - nx) ** 2 + (cy - ny) ** 2 <= radius * radius
+
+
+def rect_normal(rect, x, y, dx=0, dy=0):
+    """
+        Get the normal of the face of rect closest to point x, y.
+        On corners the face facing against direction dx, dy wins.
+    """
+    faces = ((x - rect.left, (-1, 0)), (rect.right - x, (1, 0)),
+             (y - rect.top, (0, -1)), (rect.bottom - y, (0, 1)))
+    return min(faces, key=lambda face: (abs(face[0]),
+               face[1][0] * dx + face[1][1] * dy >= 0))[1]
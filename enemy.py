@@ -1,11 +1,58 @@
 import pygame
 from cake.gameobject import GameObject
 
+ENEMY_HEALTH = 3
+
+
 class Enemy(GameObject):
+    """
+        @self.health        = float, the enemy dies once it reaches 0
 
-    def __init__(self, x, y, world):
+        @self.max_health    = float, health the enemy spawns with
+    """
+
+    def __init__(self, x, y, world, health=ENEMY_HEALTH):
         image = pygame.Surface((50, 50))
         image.fill((128,0,0))
         super(Enemy, self).__init__(image)
         self.set_position(x, y)
         self.world = world
+        self.speed = 2
+        self.attack_range = 40
+        self.max_health = health
+        self.health = health
+
+    def reset(self, x=0, y=0):
+        super(Enemy, self).reset(x, y)
+        self.health = self.max_health
+
+    def on_shot(self, shot):
+        """Take the shot's damage, dying once out of health"""
+        if self.health <= 0:
+            return
+        self.health -= shot.damage
+        if self.health <= 0:
+            self.die()
+
+    def die(self):
+        """Remove the enemy from its world, pooled enemies are released"""
+        if self.world is not None:
+            self.world.remove(self)
+
+    def think(self, dt, perception):
+        """
+            Called by AIScheduler, dt is the time since this enemy
+            last thought, which is more than a frame for far enemies.
+            Chase the target while it's in sight, otherwise follow the
+            flow field towards it, stand still if neither leads anywhere.
+        """
+        direction = 0
+        if perception.distance > self.attack_range:
+            if perception.visible:
+                direction = 1 if perception.direction[0] > 0 else -1
+            else:
+                direction = perception.steering[0]
+        if direction and self.world.is_move_valid(self, x=direction * self.speed):
+            self.set_velocityx(direction * self.speed)
+        else:
+            self.set_velocityx(0)
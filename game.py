@@ -4,9 +4,19 @@ import pygame
 
 from cake.gameobject import GameObject
 from cake.input import EventHandler
+from cake.tilemap import TileMap
+from cake.pool import ObjectPool
+from cake.particle import ParticleSystem, governor
+from cake.timer import TimerQueue
 from world import World
 from player import Player
 from enemy import Enemy
+from ai import AIScheduler
+from navigation import NavGrid, FlowField
+from wave import WaveDirector
+
+TILE_SIZE = 10
+ENEMY_POOL_SIZE = 16
 
 
 class Game:
@@ -45,17 +55,29 @@ class Game:
         # put level info outside 'game_data' to allow for level selection in future menus
         data['level'] = 1
         w = World(data['SCREEN_SIZE'][0]*2, data['SCREEN_SIZE'][1], data['SCREEN_SIZE'], bg_color=(0, 255, 255)) 
+        tiles = TileMap(w.width // TILE_SIZE, w.height // TILE_SIZE, TILE_SIZE)
+        tiles.fill_rect((0, 350, w.width, w.height - 350))
+        w.set_tilemap(tiles, color=(90, 60, 30))
         p = Player(100, 300, w)
-        e = Enemy(10, 300, w)
+        enemy_pool = ObjectPool(lambda: Enemy(0, 0, w), ENEMY_POOL_SIZE)
+        waves = WaveDirector(w, enemy_pool)
+        waves.add_wave([(10, 300)])
+        waves.add_wave([(10 + 60 * i, 300) for i in range(ENEMY_POOL_SIZE)])
         e2 = Enemy(300, 300, w)
         w.add_player(p) 
-        w.add_enemy(e)
         w.add_collideable(e2)
         # w.set_focus(p)
         game= {}
-        game['particles'] = pygame.sprite.Group()
-        game['spawners'] = pygame.sprite.Group()
+        game['particles'] = ParticleSystem()
+        governor.watch(game['particles'])
+        # spawners are started on this queue, see ParticleSpawner.start
+        game['timers'] = TimerQueue(time.time())
         game['world'] = w
+        game['enemy_pool'] = enemy_pool
+        game['waves'] = waves
+        game['nav'] = FlowField(NavGrid(w))
+        game['ai'] = AIScheduler(w, flow=game['nav'])
+        enemy_pool.on_release = game['ai'].forget
         game['player'] = p
         data['game'] = game
         self.data = data
@@ -73,21 +95,27 @@ class Game:
         events = self.events
         t1 = time.time()
         particles = game['particles']
-        spawners = game['spawners']
+        timers = game['timers']
         world = game['world']
+        ai = game['ai']
+        waves = game['waves']
 
         # game loop
         while self.data['in_game']:
             clock.tick(fps)
+            governor.frame(clock.get_rawtime() / 1000.)
             screen.fill((148,148,148))
             events.handle_events()
 
             t2 = time.time()
             dt = t2 - t1
 
+            waves.update()
+            ai.update(dt)
             world.update(dt, screen)
-            particles.update(dt, screen)
-            spawners.update(t2)
+            timers.advance(t2)
+            particles.update(t2)
+            particles.draw(screen, viewport=screen.get_rect())
             pygame.display.flip()
 
 
@@ -0,0 +1,190 @@
+import time
+import numpy as np
+
+# neighbour offsets, a cell's direction is an index into this
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1),
+              (1, 1), (1, -1), (-1, 1), (-1, -1))
+OPPOSITE = tuple(DIRECTIONS.index((-dx, -dy)) for dx, dy in DIRECTIONS)
+NO_DIRECTION = 255
+UNREACHED = -1
+
+NAV_CELL_SIZE = 25
+
+# min frames between two flow field builds
+FLOW_INTERVAL = 10
+
+# seconds per frame spent building a flow field
+FLOW_BUDGET = 0.001
+
+
+class NavGrid(object):
+    """
+        Grid of blocked cells built from a World's tile map and
+        collideables, used by FlowField.
+
+        @self.cell_size     = int, width and height of a cell in pixels
+
+        @self.cols          = int
+
+        @self.rows          = int
+
+        @self.blocked       = bytearray, cols * rows, non zero if the cell is blocked
+    """
+
+    def __init__(self, world, cell_size=None):
+        if cell_size is None:
+            tmap = world.tilemap
+            cell_size = tmap.tile_size if tmap is not None else NAV_CELL_SIZE
+        self.world = world
+        self.cell_size = cell_size
+        self.cols = -(-world.width // cell_size)
+        self.rows = -(-world.height // cell_size)
+        self.blocked = bytearray(self.cols * self.rows)
+        self.rebuild()
+
+    def rebuild(self):
+        """Mark blocked cells again, call after level geometry changes"""
+        blocked = self.blocked
+        blocked[:] = bytes(len(blocked))
+        world = self.world
+        tmap = world.tilemap
+        if tmap is not None:
+            for rect in tmap.solid_rects():
+                self.__block_rect__(rect)
+        for obj in world.collideables:
+            self.__block_rect__(obj.rect)
+
+    def __block_rect__(self, rect):
+        cs = self.cell_size
+        c0 = max(rect.left // cs, 0)
+        r0 = max(rect.top // cs, 0)
+        c1 = min((rect.right - 1) // cs, self.cols - 1)
+        r1 = min((rect.bottom - 1) // cs, self.rows - 1)
+        cols = self.cols
+        for row in range(r0, r1 + 1):
+            start = row * cols
+            self.blocked[start + c0:start + c1 + 1] = b'\x01' * max(c1 - c0 + 1, 0)
+
+    def cell_at(self, x, y):
+        """Get the cell index containing pixel x, y or None if outside the grid"""
+        cs = self.cell_size
+        col = int(x // cs)
+        row = int(y // cs)
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            return row * self.cols + col
+        return None
+
+
+class FlowField(object):
+    """
+        Shared flow field towards a target, every cell stores the
+        direction of the next step on a shortest path to the target,
+        so any number of enemies can steer with one lookup each.
+
+        The field is built with a breadth first search from the target's
+        cell that expands a whole ring of cells at a time with NumPy.
+        Builds are started at most every FLOW_INTERVAL frames and only
+        when the target changed cell, and are spread over frames,
+        expanding rings for up to FLOW_BUDGET seconds per frame and at
+        least one. Lookups use the last complete field until a new one
+        is done.
+
+        @self.grid          = NavGrid
+
+        @self.directions    = uint8 array, complete field, index into DIRECTIONS
+                              per cell, NO_DIRECTION if unreachable or the target
+
+        @self.target_cell   = int, cell the complete field leads to
+    """
+
+    def __init__(self, grid, interval=FLOW_INTERVAL, budget=FLOW_BUDGET):
+        self.grid = grid
+        self.interval = interval
+        self.budget = budget
+        n = grid.cols * grid.rows
+        self.directions = np.full(n, NO_DIRECTION, dtype=np.uint8)
+        self.target_cell = None
+        self.frame = 0
+        self._last_build = None
+        # state of the build in progress
+        self._building = None
+        self._dist = np.full(n, UNREACHED, dtype=np.int32)
+        self._next_dirs = np.full(n, NO_DIRECTION, dtype=np.uint8)
+        self._frontier = np.zeros(0, dtype=np.int64)
+        self._ring = 0
+
+    def __start__(self, cell):
+        self._dist.fill(UNREACHED)
+        self._next_dirs.fill(NO_DIRECTION)
+        self._dist[cell] = 0
+        self._frontier = np.array([cell], dtype=np.int64)
+        self._ring = 0
+        self._building = cell
+        self._last_build = self.frame
+
+    def __expand__(self, budget):
+        """
+            Expand rings of the search for up to budget seconds, at
+            least one, returns True once the build is done.
+        """
+        deadline = time.perf_counter() + budget
+        grid = self.grid
+        cols, rows = grid.cols, grid.rows
+        blocked = np.frombuffer(grid.blocked, dtype=np.uint8) != 0
+        dist = self._dist
+        dirs = self._next_dirs
+        frontier = self._frontier
+        while len(frontier):
+            self._ring += 1
+            col = frontier % cols
+            row = frontier // cols
+            ring = []
+            for i, (dx, dy) in enumerate(DIRECTIONS):
+                inside = (col + dx >= 0) & (col + dx < cols) & \
+                         (row + dy >= 0) & (row + dy < rows)
+                src = frontier[inside]
+                n = src + dy * cols + dx
+                # cells reached earlier, this ring included, are skipped
+                keep = (dist[n] == UNREACHED) & ~blocked[n]
+                if dx and dy:
+                    # don't cut corners of blocked cells
+                    keep &= ~blocked[src + dx] & ~blocked[src + dy * cols]
+                n = n[keep]
+                if len(n):
+                    dist[n] = self._ring
+                    # step from n back towards src is the opposite direction
+                    dirs[n] = OPPOSITE[i]
+                    ring.append(n)
+            frontier = np.concatenate(ring) if ring else frontier[:0]
+            if time.perf_counter() >= deadline:
+                break
+        self._frontier = frontier
+        return not len(frontier)
+
+    def update(self, target_pos):
+        """
+            Call once per frame with the target's position, starts
+            a build when due and advances the build in progress.
+        """
+        self.frame += 1
+        cell = self.grid.cell_at(*target_pos)
+        if cell is not None and self._building is None and cell != self.target_cell:
+            if self._last_build is None or self.frame - self._last_build >= self.interval:
+                self.__start__(cell)
+        if self._building is not None and self.__expand__(self.budget):
+            self.directions, self._next_dirs = self._next_dirs, self.directions
+            self.target_cell = self._building
+            self._building = None
+
+    def direction_at(self, x, y):
+        """
+            Get the (dx, dy) step direction from pixel x, y towards the
+            target, (0, 0) if at the target, unreachable or outside the grid
+        """
+        cell = self.grid.cell_at(x, y)
+        if cell is None:
+            return 0, 0
+        i = int(self.directions[cell])
+        if i == NO_DIRECTION:
+            return 0, 0
+        return DIRECTIONS[i]
@@ -1,6 +1,7 @@
 
 import pygame
 from cake.gameobject import GameObject
+from weapon import Pistol
 
 class Player(GameObject):
 
@@ -14,6 +15,10 @@ class Player(GameObject):
         self.set_gravity(0, 6)
         self.groundy = 0
         self.auto_focus = True
+        # player input moves the position directly, never sleep
+        self.can_sleep = False
+        self.pistol = Pistol()
+        self.facing = 1
 
     def collide(self, other, extra=None):
         pass
@@ -60,6 +65,17 @@ class Player(GameObject):
         if y < 0:
             if not self.world.is_move_valid(self, y=int(y), wall_check=False):
                 self.velocity.y = y/-2
+
+        # land on solid tiles when falling, dropping onto the surface
+        # instead of stopping short of it
+        elif y > 0:
+            if not self.world.is_move_valid(self, y=max(int(y), 1), wall_check=False):
+                step = int(y)
+                while step > 0 and not self.world.is_move_valid(self, y=step, wall_check=False):
+                    step -= 1
+                self.position.y += step
+                self.toggle_airborne(False)
+                self.velocity.y = y = 0
         
         super(Player, self).__move__()
         self.velocity.y = y
@@ -68,13 +84,17 @@ class Player(GameObject):
         
         keystate = pygame.key.get_pressed()
         if keystate[pygame.K_LEFT]:
+            self.facing = -1
             if self.is_move_valid(x=-self.speed):
                 self.position.x -= self.speed
         if keystate[pygame.K_RIGHT]:
+            self.facing = 1
             if self.is_move_valid(x=self.speed):
                 self.position.x += self.speed
         if keystate[pygame.K_UP]:
             self.jump()
+        if keystate[pygame.K_SPACE]:
+            self.shoot()
          
         if self.airborne and self.position.y > self.groundy:
             self.position.y = self.groundy
@@ -87,3 +107,13 @@ class Player(GameObject):
             self.groundy = self.position.y
             self.toggle_airborne(True)
             self.set_velocityy(-15)
+
+    def shoot(self, t=None):
+        """
+            Fire pistol in the direction the player is facing. t defaults
+            to pygame's clock, which keeps running across pause and resume
+            unlike the time World.update receives, so cooldowns hold.
+        """
+        if t is None:
+            t = pygame.time.get_ticks() / 1000.
+        return self.pistol.fire(t, self, (self.facing, 0))
@@ -0,0 +1,313 @@
+import numpy as np
+
+from collision import LAYER_SOLID, LAYER_ENEMY, LAYER_PROJECTILE, rect_normal
+from weapon import RayHit, Shot
+
+PROJECTILE_CAPACITY = 1024
+
+
+class ProjectileSystem(object):
+    """
+        Simulates every live projectile (slow rounds, grenades, shell
+        casings) in NumPy arrays instead of one sprite per projectile.
+        Projectiles are advanced in one vectorized step, tested against
+        the world's tiles and spatial index as a batch and drawn with
+        a single blits call. Projectiles that move further than a tile
+        or an index cell in one step are swept along their path instead,
+        so fast rounds can't pass through thin walls or objects.
+
+        Projectiles belong to LAYER_PROJECTILE, like layers_match an
+        object is only hit if it is in a projectile's mask and has
+        LAYER_PROJECTILE in its collides_with.
+
+        Row i of every array belongs to the i'th live projectile, dead
+        projectiles are compacted away at the end of each step.
+
+        @self.position      = float array (capacity, 2), world position
+
+        @self.velocity      = float array (capacity, 2), pixels per frame
+
+        @self.gravity       = float array (capacity, 2), added to velocity every frame
+
+        @self.life          = float array, seconds left to live
+
+        @self.mask          = int array, categories the projectile can hit
+
+        @self.damage        = float array
+
+        @self.kind          = int array, index into self.images
+
+        @self.owner         = object array, GameObject that fired the projectile,
+                              never hit by it
+
+        @self.images        = list of pygame.Surface, one per kind of projectile
+
+        @self.n             = int, number of live projectiles
+    """
+
+    def __init__(self, world, capacity=PROJECTILE_CAPACITY):
+        self.world = world
+        self.n = 0
+        self.images = []
+        self._last_t = None
+        self.__alloc__(max(capacity, 1))
+
+    def __alloc__(self, capacity):
+        n = self.n
+        old = getattr(self, 'position', None)
+        arrays = {
+            'position': np.zeros((capacity, 2)),
+            'velocity': np.zeros((capacity, 2)),
+            'gravity': np.zeros((capacity, 2)),
+            'life': np.zeros(capacity),
+            'mask': np.zeros(capacity, dtype=np.int64),
+            'damage': np.zeros(capacity),
+            'kind': np.zeros(capacity, dtype=np.int64),
+            'owner': np.empty(capacity, dtype=object),
+        }
+        for name, arr in arrays.items():
+            if old is not None:
+                arr[:n] = getattr(self, name)[:n]
+            setattr(self, name, arr)
+        self.capacity = capacity
+
+    def add_kind(self, image):
+        """Register an image for a kind of projectile, returns the kind"""
+        self.images.append(image)
+        return len(self.images) - 1
+
+    def spawn(self, pos, velocity, life=2.0, owner=None, kind=0,
+              mask=LAYER_SOLID | LAYER_ENEMY, gravity=(0, 0), damage=1):
+        """Spawn a projectile, returns its row"""
+        if self.n == self.capacity:
+            self.__alloc__(self.capacity * 2)
+        i = self.n
+        self.position[i] = pos
+        self.velocity[i] = velocity
+        self.gravity[i] = gravity
+        self.life[i] = life
+        self.mask[i] = mask
+        self.damage[i] = damage
+        self.kind[i] = kind
+        self.owner[i] = owner
+        self.n += 1
+        return i
+
+    def __compact__(self, alive):
+        keep = np.flatnonzero(alive)
+        k = len(keep)
+        if k == self.n:
+            return
+        for name in ('position', 'velocity', 'gravity', 'life', 'mask',
+                     'damage', 'kind', 'owner'):
+            arr = getattr(self, name)
+            arr[:k] = arr[keep]
+        self.owner[k:self.n] = None
+        self.n = k
+
+    def __hit_tiles__(self, prev, pos, alive):
+        """
+            Get a bool array of the live projectiles stopped by solid
+            tiles. Projectiles moving up to a tile per step are tested
+            where they ended up, faster ones are swept from prev with
+            TileMap.raycast and moved back to where they hit.
+        """
+        stopped = np.zeros(len(alive), dtype=bool)
+        tmap = self.world.tilemap
+        if tmap is None:
+            return stopped
+        ts = tmap.tile_size
+        live = alive & (self.mask[:self.n] & LAYER_SOLID != 0)
+        fast = live & (np.abs(pos - prev).max(axis=1) > ts)
+        for i in np.flatnonzero(fast).tolist():
+            start = prev[i].tolist()
+            end = pos[i].tolist()
+            hit = tmap.raycast(start, end)
+            if hit is not None:
+                t = hit[0]
+                pos[i] = (start[0] + (end[0] - start[0]) * t,
+                          start[1] + (end[1] - start[1]) * t)
+                stopped[i] = True
+        cells = np.frombuffer(tmap.get_cells(), dtype=np.uint8)
+        col = np.floor_divide(pos[:, 0], ts).astype(np.int64)
+        row = np.floor_divide(pos[:, 1], ts).astype(np.int64)
+        inside = (col >= 0) & (col < tmap.cols) & (row >= 0) & (row < tmap.rows)
+        idx = np.flatnonzero(inside & live & ~fast)
+        if len(idx):
+            solid = cells[row[idx] * tmap.cols + col[idx]] != 0
+            stopped[idx[solid]] = True
+        return stopped
+
+    def __sweep_objects__(self, prev, pos, alive, fast):
+        """Raycast fast projectiles from prev to pos, see World.raycast"""
+        world = self.world
+        mask = self.mask
+        owner = self.owner
+        hits = []
+        for i in np.flatnonzero(fast).tolist():
+            start = prev[i].tolist()
+            end = pos[i].tolist()
+            found = world.raycast(start, end, int(mask[i]), first_only=True,
+                                  ignore=owner[i], category=LAYER_PROJECTILE)
+            if found:
+                obj, dist = found[0]
+                dx = end[0] - start[0]
+                dy = end[1] - start[1]
+                length = (dx * dx + dy * dy) ** 0.5
+                t = dist / length if length else 0
+                pos[i] = (start[0] + dx * t, start[1] + dy * t)
+                alive[i] = False
+                hits.append((i, obj))
+        return hits
+
+    def __hit_objects__(self, prev, pos, alive):
+        """
+            Test the segments live projectiles moved along this step
+            against the world's spatial index. A segment of up to an
+            index cell per axis only crosses cells of the 2x2 block
+            spanning its start and end cell, so projectiles are grouped
+            by those cells, each bucket is looked up once and every
+            object in it is swept against all of that cell's segments
+            at once. Faster ones are raycast. Projectiles that hit are
+            moved back to where they hit the nearest object.
+        """
+        index = self.world.index
+        cs = index.cell_size
+        fast = alive & (np.abs(pos - prev).max(axis=1) > cs)
+        hits = self.__sweep_objects__(prev, pos, alive, fast)
+        live = np.flatnonzero(alive & ~fast)
+        if len(live) == 0:
+            return hits
+        c0 = np.floor_divide(prev[live], cs).astype(np.int64)
+        c1 = np.floor_divide(pos[live], cs).astype(np.int64)
+        # cells as one int, col * span + row, so grouping is a 1d sort
+        low = np.minimum(c0, c1).min(axis=0)
+        c0 -= low
+        c1 -= low
+        span = max(c0[:, 1].max(), c1[:, 1].max()) + 1
+        # projectile and cell for every cell of the block, once each
+        members = np.concatenate([live] * 4)
+        cells = np.concatenate([cx[:, 0] * span + cy[:, 1]
+                                for cx in (c0, c1) for cy in (c0, c1)])
+        base = cells.max() + 1
+        members, cells = np.divmod(np.unique(members * base + cells), base)
+        order = np.argsort(cells, kind='stable')
+        members = members[order]
+        cells = cells[order]
+        starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+        bounds = np.r_[starts, len(cells)]
+        uniq = [(int(c // span + low[0]), int(c % span + low[1])) for c in cells[starts].tolist()]
+        mask = self.mask
+        owner = self.owner
+        delta = pos - prev
+        best_t = np.full(len(alive), np.inf)
+        best = {}
+        for u, (col, row) in enumerate(uniq):
+            bucket = index.cell_bucket(col, row)
+            if not bucket:
+                continue
+            group = members[bounds[u]:bounds[u + 1]]
+            for obj in bucket:
+                if not obj.collides_with & LAYER_PROJECTILE:
+                    continue
+                can_hit = (mask[group] & obj.category != 0) & (owner[group] != obj)
+                if not can_hit.any():
+                    continue
+                rows = group[can_hit]
+                t = _segment_rect(prev[rows], delta[rows], obj.rect)
+                closer = t < best_t[rows]
+                for i, ti in zip(rows[closer].tolist(), t[closer].tolist()):
+                    best_t[i] = ti
+                    best[i] = obj
+        for i, obj in best.items():
+            pos[i] = prev[i] + delta[i] * best_t[i]
+            alive[i] = False
+            hits.append((i, obj))
+        return hits
+
+    def step(self, t):
+        """
+            Advance every projectile one frame, t is the same time
+            value World.update receives.
+        """
+        last = self._last_t
+        self._last_t = t
+        n = self.n
+        if n == 0:
+            return
+        # t restarts when the game is resumed, so it can go backwards
+        dt = max(t - last, 0) if last is not None else 0
+        vel = self.velocity[:n]
+        pos = self.position[:n]
+        prev = pos.copy()
+        vel += self.gravity[:n]
+        pos += vel
+        life = self.life[:n]
+        life -= dt
+        alive = life > 0
+
+        # objects in front of a wall are still hit, so the walls are
+        # applied after the object test
+        stopped = self.__hit_tiles__(prev, pos, alive)
+        hits = self.__hit_objects__(prev, pos, alive)
+        alive &= ~stopped
+        shots = []
+        for i, obj in hits:
+            x, y = pos[i].tolist()
+            shot = Shot(prev[i], (x, y), self.owner[i], int(self.mask[i]), float(self.damage[i]))
+            dx, dy = vel[i].tolist()
+            shot.hit = RayHit(obj, (x, y), rect_normal(obj.rect, x, y, dx, dy),
+                              float(np.hypot(x - prev[i][0], y - prev[i][1])))
+            shots.append(shot)
+        self.__compact__(alive)
+        for shot in shots:
+            obj = shot.hit.obj
+            obj.wake()
+            obj.on_shot(shot)
+
+    def draw(self, surf, offset=(0, 0)):
+        """
+            Draw every live projectile with one blits call,
+            offset is subtracted from world positions.
+        """
+        n = self.n
+        if n == 0 or not self.images:
+            return
+        images = self.images
+        ox, oy = offset
+        xy = np.round(self.position[:n] - (ox, oy)).astype(np.int64).tolist()
+        kinds = self.kind[:n].tolist()
+        surf.blits([(images[k], p) for k, p in zip(kinds, xy)], doreturn=False)
+
+    def clear(self):
+        self.owner[:self.n] = None
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+
+def _segment_rect(start, delta, rect):
+    """
+        Vectorized ray_rect, slab test of the segments start -> start +
+        delta (arrays (n, 2)) against rect. Returns the fraction of each
+        segment at which it enters rect, 0 if it starts inside, or inf
+        on a miss.
+    """
+    n = len(start)
+    t0 = np.zeros(n)
+    t1 = np.ones(n)
+    inf = np.inf
+    for axis, lo, hi in ((0, rect.left, rect.right), (1, rect.top, rect.bottom)):
+        p = start[:, axis]
+        d = delta[:, axis]
+        still = d == 0
+        inside = (p >= lo) & (p < hi)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a = (lo - p) / d
+            b = (hi - p) / d
+        near = np.where(still, np.where(inside, -inf, inf), np.minimum(a, b))
+        far = np.where(still, np.where(inside, inf, -inf), np.maximum(a, b))
+        t0 = np.maximum(t0, near)
+        t1 = np.minimum(t1, far)
+    return np.where(t0 <= t1, t0, inf)
@@ -0,0 +1,88 @@
+import pygame
+from collision import LAYER_TRIGGER, LAYER_PLAYER
+
+
+class Trigger(object):
+    """
+        Static area that calls back when objects enter or leave it,
+        used for checkpoints, doors, ambushes and such.
+        Triggers are created and indexed by World.add_trigger.
+
+        @self.rect          = pygame.Rect, area covered by the trigger
+
+        @self.on_enter      = callable, called with the object entering the trigger
+
+        @self.on_exit       = callable, called with the object leaving the trigger
+
+        @self.category      = int, collision layer of the trigger
+
+        @self.collides_with = int, mask of categories that can set off the trigger
+
+        @self.occupants     = set of objects currently inside the trigger
+    """
+
+    def __init__(self, rect, on_enter=None, on_exit=None, collides_with=LAYER_PLAYER):
+        self.rect = pygame.Rect(rect)
+        self.on_enter = on_enter
+        self.on_exit = on_exit
+        self.category = LAYER_TRIGGER
+        self.collides_with = collides_with
+        self.occupants = set()
+
+    def enter(self, obj):
+        self.occupants.add(obj)
+        if self.on_enter is not None:
+            self.on_enter(obj)
+
+    def exit(self, obj):
+        self.occupants.discard(obj)
+        if self.on_exit is not None:
+            self.on_exit(obj)
+
+
+########################################################################
+## Unit Testing                                                       ##
+########################################################################
+if __name__ == '__main__':
+
+    import unittest
+    from world import World
+    from cake.gameobject import GameObject
+    from collision import LAYER_ENEMY, LAYER_ITEM
+
+    class UnitTestTrigger(unittest.TestCase):
+
+        def setUp(self):
+            pygame.display.init()
+            self.screen = pygame.display.set_mode((100, 100))
+            self.world = World(400, 100, (100, 100))
+            self.entered = []
+
+        def run_through(self, obj, collides_with):
+            world = self.world
+            world.add_trigger((200, 0, 20, 100), self.entered.append,
+                              collides_with=collides_with)
+            obj.set_position(150, 10)
+            world.update(0, self.screen)
+            obj.set_position(205, 10)
+            world.update(0, self.screen)
+
+        def test_enemy_trigger(self):
+            enemy = GameObject(pygame.Surface((10, 10)))
+            self.world.add_enemy(enemy)
+            self.run_through(enemy, LAYER_ENEMY)
+            self.assertEqual(self.entered, [enemy])
+
+        def test_item_trigger(self):
+            item = GameObject(pygame.Surface((10, 10)))
+            self.world.add_item(item)
+            self.run_through(item, LAYER_ITEM)
+            self.assertEqual(self.entered, [item])
+
+        def test_other_category_ignored(self):
+            enemy = GameObject(pygame.Surface((10, 10)))
+            self.world.add_enemy(enemy)
+            self.run_through(enemy, LAYER_PLAYER)
+            self.assertEqual(self.entered, [])
+
+    unittest.main()
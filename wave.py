@@ -0,0 +1,97 @@
+import time
+from collections import deque
+
+# seconds per frame spent activating queued spawns
+SPAWN_BUDGET = 0.002
+
+# most spawns activated in one frame, even if under budget
+MAX_SPAWNS_PER_FRAME = 8
+
+
+class WaveDirector(object):
+    """
+        Spawns waves of enemies from an ObjectPool without frame time
+        spikes. Enemies for the largest wave are built during level load,
+        spawns of a wave are queued and activated a few per frame within
+        SPAWN_BUDGET seconds, and enemies removed from the world go back
+        to the pool to be reused by later waves.
+
+        @self.world         = World enemies are added to
+
+        @self.pool          = cake.pool.ObjectPool of enemies, acquire(x, y)
+                              must give an enemy at x, y
+
+        @self.waves         = deque of waves not started yet, a wave is a
+                              list of (x, y) spawn positions
+
+        @self.pending       = deque of (x, y) spawns of the current wave
+                              not activated yet
+
+        @self.active        = set of enemies spawned by the current wave
+    """
+
+    def __init__(self, world, pool, budget=SPAWN_BUDGET,
+                 max_per_frame=MAX_SPAWNS_PER_FRAME):
+        self.world = world
+        self.pool = pool
+        self.budget = budget
+        self.max_per_frame = max_per_frame
+        self.waves = deque()
+        self.pending = deque()
+        self.active = set()
+        self.wave = 0
+
+    def add_wave(self, spawns, prewarm=True):
+        """
+            Queue a wave, by default the pool is grown now so the wave
+            never builds enemies while it's being spawned.
+        """
+        spawns = list(spawns)
+        self.waves.append(spawns)
+        if prewarm:
+            self.prewarm(len(spawns))
+
+    def prewarm(self, n):
+        """Make sure at least n enemies are free, call during level load"""
+        self.pool.prewarm(n)
+
+    def __prune__(self):
+        enemies = self.world.enemies
+        self.active = set(e for e in self.active if e in enemies)
+
+    def is_cleared(self):
+        """Check if the current wave is fully spawned and defeated"""
+        self.__prune__()
+        return not self.pending and not self.active
+
+    def start_next(self):
+        """Start the next queued wave, returns False if there is none"""
+        if not self.waves:
+            return False
+        self.pending.extend(self.waves.popleft())
+        self.wave += 1
+        return True
+
+    def update(self):
+        """
+            Call once per frame, starts the next wave once the current one
+            is cleared and activates queued spawns within the frame budget.
+            At least one spawn is activated per frame so waves always finish.
+        """
+        if not self.pending and self.waves and self.is_cleared():
+            self.start_next()
+        pending = self.pending
+        if not pending:
+            return
+        world = self.world
+        pool = self.pool
+        deadline = time.perf_counter() + self.budget
+        spawned = 0
+        while pending and spawned < self.max_per_frame:
+            x, y = pending.popleft()
+            enemy = pool.acquire(x, y)
+            world.add_enemy(enemy)
+            self.active.add(enemy)
+            spawned += 1
+            if time.perf_counter() >= deadline:
+                break
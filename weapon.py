@@ -0,0 +1,93 @@
+from collision import LAYER_SOLID, LAYER_ENEMY
+
+
+class RayHit(object):
+    """
+        Result of a hitscan.
+
+        @self.obj           = GameObject that was hit, None if the ray hit
+                              level geometry
+
+        @self.point         = tuple, world position the ray hit at
+
+        @self.normal        = tuple, normal of the face that was hit
+
+        @self.distance      = float, distance from the start of the ray
+    """
+
+    def __init__(self, obj, point, normal, distance):
+        self.obj = obj
+        self.point = point
+        self.normal = normal
+        self.distance = distance
+
+
+class Shot(object):
+    """
+        A queued hitscan shot, resolved by World at the end of
+        the frame along with every other shot fired that frame.
+
+        @self.start         = tuple, muzzle position
+
+        @self.end           = tuple, position at the end of the weapon's range
+
+        @self.owner         = GameObject that fired the shot, never hit by it
+
+        @self.mask          = int, categories the shot can hit
+
+        @self.damage        = damage passed on to the GameObject that is hit
+
+        @self.hit           = RayHit once resolved, None on a miss
+    """
+
+    def __init__(self, start, end, owner=None, mask=LAYER_SOLID, damage=1):
+        self.start = tuple(start)
+        self.end = tuple(end)
+        self.owner = owner
+        self.mask = mask
+        self.damage = damage
+        self.hit = None
+
+
+class Pistol(object):
+    """
+        Hitscan weapon, shots are rays cast from the muzzle so
+        no bullet objects are ever created.
+
+        @self.range         = int, max distance a shot travels
+
+        @self.cooldown      = float, min time between shots
+
+        @self.damage        = damage of a shot
+
+        @self.mask          = int, categories shots can hit
+
+        @self._last_shot    = time the last shot was fired at, fire times must
+                              come from a clock that never goes backwards
+    """
+
+    def __init__(self, range=400, cooldown=0.3, damage=1, mask=LAYER_SOLID | LAYER_ENEMY):
+        self.range = range
+        self.cooldown = cooldown
+        self.damage = damage
+        self.mask = mask
+        self._last_shot = None
+
+    def can_fire(self, t):
+        return self._last_shot is None or t - self._last_shot >= self.cooldown
+
+    def fire(self, t, owner, direction, muzzle=None):
+        """
+            Queue a shot from owner in direction (a normalized
+            x, y pair), fired from muzzle or the centre of owner's rect.
+            Returns the queued Shot, or None if still cooling down.
+        """
+        if not self.can_fire(t):
+            return None
+        self._last_shot = t
+        start = muzzle if muzzle is not None else owner.rect.center
+        end = (start[0] + direction[0] * self.range,
+               start[1] + direction[1] * self.range)
+        shot = Shot(start, end, owner, self.mask, self.damage)
+        owner.world.queue_shot(shot)
+        return shot
@@ -2,12 +2,29 @@ import pygame
 import random
 
 from cake.gameobject import GameObject
+from cake.physics import PhysicsStore
+from cake.spatial import SpatialHash, grid_traverse
 from collision import *
 from animation import Animation
+from trigger import Trigger
+from weapon import RayHit
+from projectile import ProjectileSystem
 
 # used for shaking the world
 SHAKE_PADDING = 5
 
+# idle frames before an object falls asleep
+SLEEP_FRAMES = 60
+
+# sleeping objects this close to the camera are woken up
+WAKE_MARGIN = 100
+
+# cell size of the static trigger index
+TRIGGER_CELL_SIZE = 128
+
+# cell size of the spatial index of GameObjects
+INDEX_CELL_SIZE = 64
+
 class World:
 
     """
@@ -16,7 +33,8 @@ class World:
         between GameObjects and also the blitting
         of GameObjects to screen
     """
-    def __init__(self, width, height, screen_size, bg=None, bg_color=None):
+    def __init__(self, width, height, screen_size, bg=None, bg_color=None,
+                 sleep_frames=SLEEP_FRAMES):
         self.screen_size = screen_size
         self.background = bg if bg != None else pygame.Surface((width, height))
         self.background_color = bg_color
@@ -33,6 +51,26 @@ class World:
         self.enemies = set()
         self.players = set()
         self.all_objects = set()
+        self.awake = set()
+        self.detached = set()
+        self.sleepers = set()
+        self.sleep_frames = sleep_frames
+        self._sleeper_list = None
+        self._sleeper_rects = None
+        self._wake_area = None
+        self.contacts = set()
+        self.index = SpatialHash(INDEX_CELL_SIZE)
+        self.shots = []
+        self.physics = PhysicsStore()
+        self.projectiles = ProjectileSystem(self)
+        self._contacts_of = {}
+        self._updating = False
+        self._pending = []
+        self.triggers = SpatialHash(TRIGGER_CELL_SIZE)
+        self._trigger_mask = LAYER_NONE
+        self._occupied = {}
+        self._last_rects = {}
+        self.tilemap = None
         self.focus = None
         self.hz_focus = False
         self.vt_focus = False
@@ -43,31 +81,331 @@ class World:
         self.ani = None
         self.set_focus(pygame.Rect(0,0,0,0), animate=False)
 
-    def __add_to_all__(self, obj):
+    def __add_to_all__(self, obj, group, category=LAYER_NONE, collides_with=LAYER_ALL):
         """
             Performs necessary checks and then adds obj to 
-            self.all_objects container.
+            self.all_objects container and group.
+
+            category and collides_with are assigned to obj
+            only if it doesn't have a category yet.
+
+            While the world is updating the add is deferred
+            until the end of the frame.
 
             This should not be called directly, called indirectly
             by other add_* methods. 
         """
         assert isinstance(obj, GameObject)
+        if self._updating:
+            self._pending.append((self.__add_to_all__, (obj, group, category, collides_with)))
+            return
+        group.add(obj)
+        obj.world = self
+        if obj.category == LAYER_NONE:
+            obj.category = category
+            obj.collides_with = collides_with
+        self.index.insert(obj, obj.rect)
+        if obj._body is None and obj.is_batchable():
+            self.physics.add(obj)
         self.all_objects.add(obj)
+        if obj.sleeping:
+            self.sleepers.add(obj)
+            self._sleeper_list = None
+        else:
+            self.awake.add(obj)
+
+    def remove(self, obj):
+        """
+            Remove obj from the world. While the world is updating
+            the removal is deferred until the end of the frame, every
+            step of it is constant time. If obj was acquired from an
+            ObjectPool it is released back to it once removed.
+        """
+        if self._updating:
+            self._pending.append((self.__remove_now__, (obj,)))
+        else:
+            self.__remove_now__(obj)
+
+    def __remove_now__(self, obj):
+        if obj not in self.all_objects:
+            return
+        for group in (self.all_objects, self.awake, self.detached, self.sleepers,
+                      self.collideables, self.noncollideables, self.items,
+                      self.enemies, self.players):
+            group.discard(obj)
+        if obj.sleeping:
+            self._sleeper_list = None
+        self.index.remove(obj)
+        if obj._body is not None:
+            self.physics.remove(obj)
+        self._last_rects.pop(obj, None)
+        for pair in self._contacts_of.pop(obj, ()):
+            self.contacts.discard(pair)
+            other = pair[1] if pair[0] is obj else pair[0]
+            self._contacts_of[other].discard(pair)
+            other.on_exit(obj)
+        for trigger in self._occupied.pop(obj, ()):
+            trigger.exit(obj)
+        obj.world = None
+        pool = getattr(obj, '_pool', None)
+        if pool is not None:
+            pool.release(obj)
+
+    def __flush_pending__(self):
+        """
+            Apply adds and removals deferred during the frame in the
+            order they were made, so an object added and then removed
+            in the same frame ends up removed.
+        """
+        pending = self._pending
+        self._pending = []
+        for func, args in pending:
+            func(*args)
+
+    def sleep_object(self, obj):
+        """Put obj to sleep, it won't be updated until woken"""
+        obj.sleeping = True
+        if obj._body is not None:
+            self.physics.set_awake(obj, False)
+        self.awake.discard(obj)
+        self.sleepers.add(obj)
+        self._sleeper_list = None
+
+    def wake_object(self, obj):
+        """
+            Move obj back into the awake set, use obj.wake()
+            instead of calling this directly.
+        """
+        obj.sleeping = False
+        obj.idle_frames = 0
+        if obj._body is not None:
+            self.physics.set_awake(obj, True)
+        if obj in self.sleepers:
+            self.sleepers.discard(obj)
+            self.awake.add(obj)
+            self._sleeper_list = None
+
+    def detach(self, obj):
+        """
+            Stop simulating obj, e.g once cake.ecs.adopt hands it to
+            an entity. obj is taken out of the PhysicsStore and is no
+            longer updated or put to sleep, but it still collides, sets
+            off triggers and is drawn wherever its rect is moved to.
+        """
+        if obj._body is not None:
+            self.physics.remove(obj)
+        obj.sleeping = False
+        self.awake.discard(obj)
+        if obj in self.sleepers:
+            self.sleepers.discard(obj)
+            self._sleeper_list = None
+        self.detached.add(obj)
+
+    def get_camera_rect(self):
+        """Get the area of the world currently visible on screen"""
+        w, h = self.screen_size
+        frect = self.focus
+        x = -self.focus_offsetx
+        y = -self.focus_offsety
+        if frect:
+            if self.hz_focus:
+                x += frect.x - (w//2 - frect.width//2)
+            else:
+                x = 0
+            if self.vt_focus:
+                y += frect.y - (h//2 - frect.height//2)
+            else:
+                y = 0
+        return pygame.Rect(x, y, w, h)
+
+    def __wake_near_camera__(self):
+        """
+            Wake sleepers close to the camera and return the wake area.
+            Sleeping objects don't move, so their rects are cached until
+            the sleeper set changes and are only checked when the camera
+            has moved, as nothing can fall asleep inside the wake area.
+        """
+        area = self.get_camera_rect().inflate(WAKE_MARGIN * 2, WAKE_MARGIN * 2)
+        if not self.sleepers:
+            return area
+        if self._sleeper_list is None:
+            self._sleeper_list = list(self.sleepers)
+            self._sleeper_rects = [obj.rect for obj in self._sleeper_list]
+        elif area == self._wake_area:
+            return area
+        self._wake_area = area
+        sleepers = self._sleeper_list
+        for i in area.collidelistall(self._sleeper_rects):
+            sleepers[i].wake()
+        return area
+
+    def __update_sleep__(self, moved, area):
+        """
+            Count idle frames of awake objects outside of the wake
+            area and put those idle for self.sleep_frames frames to sleep
+        """
+        limit = self.sleep_frames
+        for obj in tuple(self.awake):
+            if not obj.can_sleep:
+                continue
+            if obj in moved or not obj.is_idle() or area.colliderect(obj.rect):
+                obj.idle_frames = 0
+                continue
+            obj.idle_frames += 1
+            if obj.idle_frames >= limit:
+                self.sleep_object(obj)
+
+    def relayer_object(self, obj):
+        """
+            Force a contact re-test of obj after its layers changed,
+            called by GameObject.set_layers.
+        """
+        self._last_rects.pop(obj, None)
+
+    def query_rect(self, rect, mask=LAYER_ALL):
+        """
+            Get objects whose category is in mask overlapping rect,
+            sorted by distance from the center of rect.
+        """
+        rect = pygame.Rect(rect)
+        found = [obj for obj in self.index.query(rect)
+                 if obj.category & mask and rect.colliderect(obj.rect)]
+        cx, cy = rect.center
+        found.sort(key=lambda obj: (obj.rect.centerx - cx) ** 2 + (obj.rect.centery - cy) ** 2)
+        return found
+
+    def query_radius(self, pos, radius, mask=LAYER_ALL):
+        """
+            Get objects whose category is in mask within radius
+            of pos, sorted by distance from pos.
+        """
+        cx, cy = pos
+        area = pygame.Rect(cx - radius, cy - radius, radius * 2 + 1, radius * 2 + 1)
+        found = [obj for obj in self.index.query(area)
+                 if obj.category & mask and circle_rect(cx, cy, radius, obj.rect)]
+        found.sort(key=lambda obj: (obj.rect.centerx - cx) ** 2 + (obj.rect.centery - cy) ** 2)
+        return found
+
+    def raycast(self, start, end, mask=LAYER_ALL, first_only=False, ignore=None,
+                category=None):
+        """
+            Cast a ray from start to end, returning a list of
+            (object, distance) for objects whose category is in mask,
+            sorted by distance. Only the index cells crossed by the
+            ray are visited, if first_only is True the walk stops as
+            soon as the closest hit is known and at most one hit is
+            returned. Objects with the precise flag are only hit
+            where their mask has a set pixel.
+
+            @ignore     = object to ignore, e.g the shooter
+
+            @category   = category of what is cast, if given objects that
+                          don't have it in their collides_with are skipped
+        """
+        x0, y0 = start
+        dx = end[0] - x0
+        dy = end[1] - y0
+        length = (dx * dx + dy * dy) ** 0.5
+        index = self.index
+        tested = set()
+        hits = []
+        best = None
+        for col, row, t_exit in grid_traverse(x0, y0, end[0], end[1], index.cell_size):
+            bucket = index.cell_bucket(col, row)
+            if bucket:
+                for obj in bucket:
+                    if obj in tested:
+                        continue
+                    tested.add(obj)
+                    if obj is ignore or not obj.category & mask:
+                        continue
+                    if category is not None and not obj.collides_with & category:
+                        continue
+                    t = ray_object(x0, y0, dx, dy, obj)
+                    if t is not None:
+                        hits.append((t, obj))
+                        if best is None or t < best:
+                            best = t
+            # anything closer would have been entered in a visited cell
+            if first_only and best is not None and best <= t_exit:
+                break
+        hits.sort(key=lambda hit: hit[0])
+        if first_only:
+            hits = hits[:1]
+        return [(obj, t * length) for t, obj in hits]
+
+    def hitscan(self, start, end, mask=LAYER_ALL, ignore=None):
+        """
+            Get the first thing the segment start -> end hits as a
+            RayHit, or None. Solid tiles are hit if LAYER_SOLID is in
+            mask, the object raycast is cut short at the tile hit.
+        """
+        x0, y0 = start
+        x1, y1 = end
+        dx = x1 - x0
+        dy = y1 - y0
+        length = (dx * dx + dy * dy) ** 0.5
+        hit = None
+        tmap = self.tilemap
+        if tmap is not None and mask & LAYER_SOLID:
+            tile_hit = tmap.raycast(start, end)
+            if tile_hit is not None:
+                t, normal = tile_hit
+                x1, y1 = x0 + dx * t, y0 + dy * t
+                hit = RayHit(None, (x1, y1), normal, length * t)
+        objs = self.raycast(start, (x1, y1), mask, first_only=True, ignore=ignore)
+        if objs:
+            obj, dist = objs[0]
+            t = dist / length if length else 0
+            x, y = x0 + dx * t, y0 + dy * t
+            hit = RayHit(obj, (x, y), rect_normal(obj.rect, x, y, dx, dy), dist)
+        return hit
+
+    def queue_shot(self, shot):
+        """Queue a weapon.Shot to be resolved at the end of the frame"""
+        self.shots.append(shot)
+
+    def __reindex__(self):
+        """
+            Move awake objects to the index cells they cover after
+            they moved this frame, so shots and projectiles see where
+            objects are now. Only objects that changed cell are touched.
+        """
+        index = self.index
+        for group in (self.awake, self.detached):
+            for obj in group:
+                index.update(obj, obj.rect)
+
+    def __resolve_shots__(self):
+        """
+            Resolve every shot queued this frame in one batch, after
+            all objects have moved. Objects that are hit have their
+            on_shot() called once per shot.
+        """
+        shots = self.shots
+        if not shots:
+            return
+        self.shots = []
+        for shot in shots:
+            shot.hit = self.hitscan(shot.start, shot.end, shot.mask, shot.owner)
+        for shot in shots:
+            hit = shot.hit
+            if hit is not None and hit.obj is not None:
+                hit.obj.wake()
+                hit.obj.on_shot(shot)
 
     def add_collideable(self, obj):
         """
             Add object player/enemies can collide with, object 
             must be instance of GameObject
         """
-        self.__add_to_all__(obj)
-        self.collideables.add(obj)
+        self.__add_to_all__(obj, self.collideables, LAYER_SOLID, SOLID_COLLIDES_WITH)
 
     def add_background_object(self, obj):
         """
             Add non-collideable object drawn onto background
         """
-        self.__add_to_all__(obj)
-        self.noncollideables.add(obj)
+        self.__add_to_all__(obj, self.noncollideables)
 
     def add_item(self, obj):
         """
@@ -75,24 +413,84 @@ class World:
             player/enemy.
 
         """
-        self.__add_to_all__(obj)
-        self.items.add(obj)
+        self.__add_to_all__(obj, self.items, LAYER_ITEM, ITEM_COLLIDES_WITH)
         
 
     def add_player(self, obj):
         """
             Add player to world.
         """
-        self.__add_to_all__(obj)
-        self.players.add(obj)
+        self.__add_to_all__(obj, self.players, LAYER_PLAYER, PLAYER_COLLIDES_WITH)
 
     def add_enemy(self, obj):
         """
             Add enemy to world
         """
-        self.__add_to_all__(obj)
-        self.enemies.add(obj)
+        self.__add_to_all__(obj, self.enemies, LAYER_ENEMY, ENEMY_COLLIDES_WITH)
         
+    def add_trigger(self, rect, on_enter=None, on_exit=None, collides_with=LAYER_PLAYER):
+        """
+            Add a static trigger volume, on_enter/on_exit are called
+            with the object that entered/left rect. Only objects whose
+            category is in collides_with set off the trigger.
+            Returns the Trigger.
+        """
+        trigger = Trigger(rect, on_enter, on_exit, collides_with)
+        self.triggers.insert(trigger, trigger.rect)
+        self._trigger_mask |= collides_with
+        return trigger
+
+    def remove_trigger(self, trigger):
+        """Remove trigger, on_exit is not called for its occupants"""
+        self.triggers.remove(trigger)
+        for obj in trigger.occupants:
+            self._occupied[obj].discard(trigger)
+        trigger.occupants.clear()
+
+    def __handle_triggers__(self, moved):
+        """
+            Check moved objects against the triggers near their swept
+            rect, i.e the area covered between last frame and this one,
+            so fast objects can't skip over a trigger. Callbacks only
+            fire when an object's occupancy of a trigger changes.
+        """
+        mask = self._trigger_mask
+        if not mask:
+            return
+        for obj, prev in moved.items():
+            if not obj.category & mask:
+                continue
+            rect = obj.rect
+            swept = rect.union(prev) if prev is not None else rect
+            occupied = self._occupied.setdefault(obj, set())
+            for trigger in self.triggers.query(swept):
+                # triggers only filter by category, objects don't
+                # need LAYER_TRIGGER in their own collides_with
+                if not obj.category & trigger.collides_with:
+                    continue
+                inside = trigger.rect.colliderect(rect)
+                if trigger in occupied:
+                    if not inside:
+                        occupied.discard(trigger)
+                        trigger.exit(obj)
+                elif inside:
+                    occupied.add(trigger)
+                    trigger.enter(obj)
+                elif trigger.rect.colliderect(swept):
+                    # passed through within a single frame
+                    trigger.enter(obj)
+                    trigger.exit(obj)
+
+    def set_tilemap(self, tilemap, color=None):
+        """
+            Set tile collision layer used for level geometry.
+            Solid tiles don't need to be added as collideables,
+            if color is given the tiles are drawn onto the background.
+        """
+        self.tilemap = tilemap
+        if color is not None:
+            tilemap.render(self.background, color)
+
     def is_move_valid(self, obj, x=0, y=0, wall_check=True): 
         """
             Check if move is valid, doesn't collide with
@@ -126,9 +524,24 @@ class World:
         if y < 0:
             collided = collide_top
 
-        return len(
-                pygame.sprite.spritecollide(
-                    obj, self.collideables, False, collided)) < 1
+        # tile lookup only visits the cells under the moved rect
+        tmap = self.tilemap
+        if tmap is not None and obj.collides_with & LAYER_SOLID:
+            if tmap.collide_rect(obj.rect.move(round(x), round(y))):
+                return False
+
+        # only collideables in the index cells around the move are
+        # visited, layers are checked before any geometry test
+        if collided is None:
+            collided = pygame.sprite.collide_rect
+        area = obj.rect.union(obj.rect.move(round(x), round(y)))
+        collideables = self.collideables
+        for other in self.index.query(area):
+            if other is obj or other not in collideables:
+                continue
+            if layers_match(obj, other) and collided(obj, other):
+                return False
+        return True
 
     def set_animation(self, tgt_x, tgt_y, delay=0):
         self.ani = Animation(x=tgt_x, y=tgt_y, transition='out_expo',
@@ -175,11 +588,31 @@ class World:
         """
         self.shake = b if b != None else not self.shake
 
+    def __moved_objects__(self):
+        """
+            Get the objects whose rect changed since the last call
+            as a dict of object -> rect it had before, newly added
+            objects count as moved with a previous rect of None.
+        """
+        last = self._last_rects
+        moved = {}
+        # sleeping objects don't move
+        for group in (self.awake, self.detached):
+            for obj in group:
+                r = tuple(obj.rect)
+                prev = last.get(obj)
+                if prev != r:
+                    last[obj] = r
+                    moved[obj] = prev
+        return moved
+
     def __handle_collisions__(self):
         """
             Handle permitted collisions, such
             as those between player and items/enemies
-            and between enemies and items.
+            and between enemies and items. Which pairs are
+            permitted is decided by the objects' collision layers,
+            see GameObject.set_layers.
             
             Non-permitted collisions such as 
             player and collideables or enemies and 
@@ -194,23 +627,64 @@ class World:
             collision should be implemented in the classes of the
             moving game objects, and checked only before the object
             moves for this very purpose.
-        """
-
-        # player collisions
-        for p in self.players:
-            sprs = pygame.sprite.spritecollide(p, self.items, False)
-            for s in sprs:
-                p.collide(s)
 
-            enemies = pygame.sprite.spritecollide(p, self.enemies, False)
-            for e in enemies:
-                p.collide(e)
+            Contacts persist between frames in self.contacts, only
+            pairs where at least one object moved since the last
+            frame are tested again. Both objects of a pair receive
+            on_enter when the contact starts, on_stay every frame
+            it persists and on_exit when it ends.
 
-        # enemy collisions
-        for e in self.enemies:
-            sprs = pygame.sprite.spritecollide(p, self.items, False)
-            for s in sprs:
-                p.collide(s)
+            Returns the objects that moved since the last frame, see
+            __moved_objects__.
+        """
+        contacts = self.contacts
+        moved = self.__moved_objects__()
+        index = self.index
+        for obj in moved:
+            index.update(obj, obj.rect)
+        touching = set()
+        retested = set()
+        for obj in moved:
+            for other in index.query(obj.rect):
+                if other is obj or not layers_match(obj, other):
+                    continue
+                pair = (obj, other) if id(obj) < id(other) else (other, obj)
+                if pair in retested:
+                    continue
+                retested.add(pair)
+                if collide_broad_precise(obj, other):
+                    touching.add(pair)
+
+        # contacts of moved objects that no longer touch
+        contacts_of = self._contacts_of
+        ended = set()
+        for obj in moved:
+            for pair in contacts_of.get(obj, ()):
+                if pair not in touching:
+                    ended.add(pair)
+        for pair in ended:
+            contacts.discard(pair)
+            a, b = pair
+            contacts_of[a].discard(pair)
+            contacts_of[b].discard(pair)
+            a.on_exit(b)
+            b.on_exit(a)
+
+        for pair in contacts:
+            a, b = pair
+            a.on_stay(b)
+            b.on_stay(a)
+
+        for pair in touching - contacts:
+            contacts.add(pair)
+            a, b = pair
+            contacts_of.setdefault(a, set()).add(pair)
+            contacts_of.setdefault(b, set()).add(pair)
+            a.wake()
+            b.wake()
+            a.on_enter(b)
+            b.on_enter(a)
+        return moved
 
     def __blit_spr__(self, spr, surf):
         """
@@ -254,7 +728,10 @@ class World:
                 self.ani = None
                 self.focus = self.target_focus
                 print("Focus: %s" % self.focus)
-        self.__handle_collisions__()
+        self._updating = True
+        wake_area = self.__wake_near_camera__()
+        moved = self.__handle_collisions__()
+        self.__handle_triggers__(moved)
         if self.shake:
             self.__shake__()
         wsurf = self.world_surf
@@ -267,8 +744,15 @@ class World:
         else:
             wsurf.blit(bg, [0,0])
         # if bg:
-        for spr in self.all_objects:
+        for spr in tuple(self.awake):
             spr.update(dt)
+        self.physics.step(dt, self.tilemap)
+        self.__reindex__()
+        self.projectiles.step(dt)
+        self.__resolve_shots__()
+        self.__update_sleep__(moved, wake_area)
+        self._updating = False
+        self.__flush_pending__()
 
         for spr in self.noncollideables:
             self.__blit_spr__(spr, wsurf)
@@ -280,5 +764,6 @@ class World:
             self.__blit_spr__(spr, wsurf)
         for spr in self.items:
             self.__blit_spr__(spr, wsurf)
+        self.projectiles.draw(wsurf, self.get_camera_rect().topleft)
         surf.blit(wsurf, [self.x, self.y])
 